@@ -36,6 +36,11 @@ class TextColor:
 
 from abc import ABC, abstractmethod
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class Route(ABC):
     @abstractmethod
@@ -56,6 +61,26 @@ class Route(ABC):
     def get_cost(self, kpl: float, fuel_price: float) -> float:
         return self.get_fuel_consumption(kpl) * fuel_price
 
+    def get_cost_coefficient(self, fuel_price: float) -> float:
+        return self.get_distance() * fuel_price / self.get_fuel_efficiency()
+
+
+# Calculates the cost of every car (rows) on every route (columns) at once.
+# Uses NumPy if it is installed, otherwise plain lists
+def get_cost_matrix(kpls, routes, fuel_price, threshold=400):
+    coefficients = [route.get_cost_coefficient(fuel_price) for route in routes]
+
+    if numpy is not None:
+        costs = numpy.outer(1 / numpy.asarray(kpls, dtype=float),
+                            coefficients)
+        return costs, costs > threshold
+
+    costs = [[coefficient / kpl for coefficient in coefficients]
+             for kpl in kpls]
+    over = [[cost > threshold for cost in row] for row in costs]
+
+    return costs, over
+
 
 class Backroad(Route):
     def get_fuel_efficiency(self) -> float:
@@ -82,9 +107,147 @@ class Highway(Route):
 PRICE = 1.48
 ROUTES: list[Route] = [Backroad(), Highway()]
 
+# ==============================================================================
+# Batch mode
+#
+# Run with --batch to price a stream of queries without any questions. Each
+# line of the input is either the name of a car in the database or name,kpl
+# for any other car. For example:
+#
+#   python main.py --batch queries.txt --format jsonl --output prices.jsonl
+
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+from itertools import islice
+
+# How many queries are priced at once
+BATCH_SIZE = 10_000
+# How many bytes of output are buffered before they are written
+BUFFER_SIZE = 1024 * 1024
+
+
+# Turns each line into (name, kpl), skipping blank lines and telling the user
+# about anything that can't be priced
+def read_queries(lines):
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+
+        if not line:
+            continue
+
+        if "," in line:
+            name, _comma, kpl = line.rpartition(",")
+            try:
+                kpl = float(kpl)
+            except ValueError:
+                kpl = 0
+        else:
+            name, kpl = line, cars.get(line.lower(), 0)
+
+        # nan and inf would print nonsense prices, like the store they are
+        # treated the same as a kpl of zero
+        if not math.isfinite(kpl) or kpl <= 0:
+            print(f"Line {number}: can't price '{line}'", file=sys.stderr)
+            continue
+
+        yield name.strip(), kpl
+
+
+def run_batch(queries, output, output_format, fuel_price):
+    writer = csv.writer(output)
+
+    if output_format == "csv":
+        writer.writerow(["car", "kpl", "route", "price", "over"])
+
+    # Only BATCH_SIZE queries are in memory at a time
+    while batch := list(islice(queries, BATCH_SIZE)):
+        prices, over = get_cost_matrix([kpl for _name, kpl in batch], ROUTES,
+                                       fuel_price)
+
+        for (name, kpl), car_prices, car_over in zip(batch, prices, over):
+            for route, price, is_over in zip(ROUTES, car_prices, car_over):
+                route_name = route.get_name()
+
+                if output_format == "csv":
+                    writer.writerow([
+                        name, kpl, route_name, f"{price:.2f}",
+                        bool(is_over)
+                    ])
+                elif output_format == "jsonl":
+                    row = {
+                        "car": name,
+                        "kpl": kpl,
+                        "route": route_name,
+                        "price": round(float(price), 2),
+                        "over": bool(is_over)
+                    }
+                    output.write(json.dumps(row) + "\n")
+                else:
+                    warning = ""
+                    if is_over:
+                        warning = (f"{TextColor.yellow} WARNING over $400!"
+                                   f"{TextColor.default}")
+                    output.write(
+                        f"{name}: {route_name}: ${price:.2f}{warning}\n")
+
+
+parser = argparse.ArgumentParser(
+    description="Compare the cost of fuel for cars")
+parser.add_argument(
+    "--batch",
+    nargs="?",
+    const="-",
+    help="price the queries in this file (or stdin) without asking anything")
+parser.add_argument("--format",
+                    choices=["csv", "jsonl", "text"],
+                    default="csv",
+                    help="output format for --batch")
+parser.add_argument("--output",
+                    default="-",
+                    help="file to write --batch results to")
+parser.add_argument("--price",
+                    type=float,
+                    default=PRICE,
+                    help="price of fuel per litre")
+parser.add_argument("--no-color",
+                    action="store_true",
+                    help="don't use colors in the output")
+args = parser.parse_args()
+
+PRICE = args.price
+
+# Blank out the colors so they don't end up in files. Also respects the
+# NO_COLOR environment variable
+if args.no_color or "NO_COLOR" in os.environ:
+    colors = [name for name in vars(TextColor) if not name.startswith("_")]
+    for color in colors:
+        setattr(TextColor, color, "")
+
+if args.batch is not None:
+    source = sys.stdin if args.batch == "-" else open(args.batch)
+
+    # One big buffer for all of the output rather than a write per line
+    if args.output == "-":
+        output = open(sys.stdout.fileno(),
+                      "w",
+                      buffering=BUFFER_SIZE,
+                      newline="",
+                      closefd=False)
+    else:
+        output = open(args.output, "w", buffering=BUFFER_SIZE, newline="")
+
+    with source, output:
+        run_batch(read_queries(source), output, args.format, PRICE)
+
+    sys.exit()
+
 while True:
     mode = input(
-        "Do you want to:\n a) Check a singe car\n b) Check all cars\n c) Exit\n$ "
+        "Do you want to:\n a) Check a singe car\n b) Check all cars\n s) Fuel price sweep\n c) Exit\n$ "
     )
 
     if mode == "a":
@@ -109,18 +272,49 @@ while True:
 
         print()
     elif mode == "b":
-        for name, kpl in cars.items():
+        # Work out every price before printing anything
+        prices, _over = get_cost_matrix(list(cars.values()), ROUTES, PRICE)
+
+        for name, car_prices in zip(cars, prices):
             print(f"{name.capitalize()}")
             print("-" * len(name))
 
-            for route in ROUTES:
-                price = route.get_cost(kpl, PRICE)
+            for route, price in zip(ROUTES, car_prices):
                 warning = f"{TextColor.yellow} WARNING The price for driving via {route.get_name().lower()} is over $400!{TextColor.default}" if price >= 400 else ""
                 print(f"{route.get_name()}: ${price:.2f} {warning}")
 
             print()
+    elif mode == "s":
+        # Ask for the range of fuel prices to try
+        try:
+            start = float(input('Lowest fuel price: '))
+            stop = float(input('Highest fuel price: '))
+            steps = int(input('Number of prices: '))
+        except ValueError:
+            print('That is not a number, try again')
+            continue
+
+        # Every cost is the route's coefficient over the car's kpl, so adding
+        # up 1 / kpl once is enough to total the fleet at any price
+        total_inverse = sum(1 / kpl for kpl in cars.values())
+
+        for step in range(max(steps, 1)):
+            fuel_price = start
+            if steps > 1:
+                fuel_price += (stop - start) * step / (steps - 1)
+            print(f"${fuel_price:.3f}/L")
+
+            for route in ROUTES:
+                coefficient = route.get_cost_coefficient(fuel_price)
+                over = sum(1 for kpl in cars.values()
+                           if coefficient / kpl > 400)
+                total = coefficient * total_inverse
+                print(f"  {route.get_name()}: total ${total:.2f}, "
+                      f"{over} cars over $400")
+
+        print()
     elif mode == "c":
         # Exit out of the loop
         break
     else:
-        print("Invalid input, try again. It should be a, b or c")
\ No newline at end of file
+        print("Invalid input, try again. It should be a, b, s or c")
\ No newline at end of file
@@ -0,0 +1,219 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Fleet sizes that are benchmarked when none are given
+SIZES = [10**3, 10**4, 10**5, 10**6]
+
+# How many cars are added one at a time when timing CarStore.add
+ADD_COUNT = 1000
+
+# The table creates a widget for every cell, so only render this many rows
+TABLE_ROWS = 10**4
+
+# How much slower a result can be than the baseline before it counts as a
+# regression
+TOLERANCE = 0.2
+
+PRICE = 1.48
+
+
+def write_fleet(location: str, size: int) -> None:
+    """
+    Writes a made up fleet of cars to a csv file. The same size always gives
+    the same fleet
+    """
+
+    generator = random.Random(size)
+
+    with open(location, 'w') as table:
+        table.writelines(f'car {i},{generator.uniform(1, 20):.2f}\n'
+                         for i in range(size))
+
+
+def timed(function, *args) -> float:
+    """
+    Returns how many seconds it takes to call function
+    """
+
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def bench_table(size: int) -> dict[str, float]:
+    """
+    Times rendering the results tables. Returns nothing if tk can't open a
+    window, which happens when there isn't a display
+    """
+
+    import tkinter
+
+    # main.py complains when it is imported, keep that out of the results
+    with contextlib.redirect_stdout(sys.stderr):
+        from main import Table, VirtualTable
+
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        return {}
+
+    # We don't want a window popping up
+    root.withdraw()
+
+    rows = [[f'car {i}', '$1.00', 'No']
+            for i in range(min(size, TABLE_ROWS))]
+    results = {}
+
+    table = Table(root)
+    results['Table.set_rows'] = timed(table.set_rows, rows)
+    results['Table.render'] = timed(table.render)
+
+    virtual = VirtualTable(root, ['Name', 'Price', 'Over $400'])
+    results['VirtualTable.set_provider'] = timed(virtual.set_provider, size,
+                                                 lambda index: rows[0])
+    results['VirtualTable.scroll_by'] = timed(virtual.scroll_by, size // 2)
+
+    root.destroy()
+    return results
+
+
+def bench_size(size: int) -> dict[str, float]:
+    """
+    Runs all of the benchmarks against a fleet of the given size. Returns the
+    number of seconds each one took
+    """
+
+    # The store always uses ./cars.csv, so work in a temporary folder
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        write_fleet('cars.csv', size)
+
+        try:
+            return bench_store(size)
+        finally:
+            # Windows won't delete the folder while we are in it
+            os.chdir(os.path.dirname(folder))
+
+
+def bench_store(size: int) -> dict[str, float]:
+    """
+    Times the car store and cost calculations against ./cars.csv
+    """
+
+    # Imported here so that the store is fresh in every process
+    from cars import Car, CarStore
+    from roads import Backroad, Highway, get_cost_matrix
+
+    results = {}
+
+    start = time.perf_counter()
+    store = CarStore()
+    results['CarStore.load'] = time.perf_counter() - start
+
+    names = [f'CAR {i}' for i in range(size)]
+    results['CarStore.get_car'] = timed(
+        lambda: [store.get_car(name) for name in names])
+
+    kpls = [car.kpl for car in store.get()]
+    routes = [Backroad(), Highway()]
+    results['Route.get_cost'] = timed(lambda: [
+        route.get_cost(kpl, PRICE) for route in routes for kpl in kpls
+    ])
+    results['get_cost_matrix'] = timed(get_cost_matrix, kpls, routes, PRICE)
+
+    def add():
+        for i in range(ADD_COUNT):
+            store.add(Car(f'new car {i}', 5.0))
+
+    results['CarStore.add'] = timed(add)
+    store.close()
+
+    results.update(bench_table(size))
+
+    return results
+
+
+def run(sizes: list[int]) -> dict:
+    """
+    Runs the benchmarks for each size in its own process so that nothing is
+    left over from the previous size
+    """
+
+    results = {}
+
+    # A new process for every size
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as pool:
+        for size in sizes:
+            print(f'Benchmarking {size} cars', file=sys.stderr)
+            results[str(size)] = pool.submit(bench_size, size).result()
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def compare(report: dict, baseline: dict,
+            tolerance: float = TOLERANCE) -> list[str]:
+    """
+    Returns a message for every benchmark that is slower than the baseline by
+    more than the tolerance
+    """
+
+    regressions = []
+
+    for size, results in report['results'].items():
+        for name, seconds in results.items():
+            before = baseline['results'].get(size, {}).get(name)
+
+            if before is not None and seconds > before * (1 + tolerance):
+                regressions.append(f'{name} with {size} cars took '
+                                   f'{seconds:.4f}s, was {before:.4f}s')
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Times the car store, cost calculations and tables')
+    parser.add_argument('sizes',
+                        nargs='*',
+                        type=int,
+                        default=SIZES,
+                        help='fleet sizes to benchmark')
+    parser.add_argument('--output', help='write the results to this file')
+    parser.add_argument('--baseline',
+                        help='results file to check for regressions against')
+    parser.add_argument('--tolerance',
+                        type=float,
+                        default=TOLERANCE,
+                        help='how much slower counts as a regression')
+    args = parser.parse_args()
+
+    report = run(args.sizes)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(report, json.load(baseline), args.tolerance)
+
+        for regression in regressions:
+            print(f'REGRESSION: {regression}', file=sys.stderr)
+
+        # Let scripts know that something got slower
+        if regressions:
+            sys.exit(1)
@@ -1,55 +1,1428 @@
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import repeat
+from typing import Callable, Iterable, Iterator, Sequence, overload
+
 # Constants for readability. Nothing used regularly should be put here because
 # it will slow down the program.
 CAR_STORE_LOCATION = './cars.csv'
 
+# Where the cars are stored when using the SQLite backend
+SQLITE_STORE_LOCATION = './cars.db'
+
+# How many cars can be appended before we force them onto the disk with fsync
+SYNC_EVERY = 32
+
+# How many dead lines (duplicates or half written cars) the file can have
+# before we rewrite it from scratch
+COMPACT_THRESHOLD = 1000
+
+# When more cars than this are picked up by a reload, the indexes are sorted
+# again rather than having each car inserted
+RELOAD_SORT_SIZE = 1000
+
+# The kpl histogram has this many bins, each this many kpl wide. The last bin
+# also holds every car past the end
+HISTOGRAM_BINS = 20
+HISTOGRAM_WIDTH = 2.0
+
+# Marks the start of a snapshot file, the number goes up if the layout or the
+# way the csv is parsed changes
+SNAPSHOT_MAGIC = b'CARSNAP4'
+
+# Snapshot header after the magic: csv size, csv modified time (ns), number of
+# cars, number of dead lines and the size of the name blob
+SNAPSHOT_HEADER = struct.Struct('<QqQQQ')
+
+# Files smaller than this many bytes are parsed in this process. Starting a
+# process pool takes longer than parsing a small file
+PARALLEL_LOAD_SIZE = 8 * 1024 * 1024
+
+
+class StoreDuplicateItem(Exception):
+    pass
+
+
+class StoreInvalidItem(Exception):
+    pass
+
+
+class Car():
+    """
+    A class used to store all of the values for a car and keep intelisense happy
+    """
+
+    # Slots stop python from giving every car its own __dict__, which is most
+    # of the memory a car uses
+    __slots__ = ('name', 'kpl')
+
+    name: str
+    kpl: float
+
+    def __init__(self, name: str, kpl: float) -> None:
+        self.name = name
+        self.kpl = kpl
+
+    def to_csv(self) -> str:
+        return f'{self.name},{self.kpl}'
+
+    def validate(self) -> None:
+        """
+        Checks that the car can be stored and read back in again
+
+        throws: StoreInvalidItem
+        """
+
+        # Names can't be blank or span multiple lines of the csv
+        if not self.name.strip() or '\n' in self.name or '\r' in self.name:
+            raise StoreInvalidItem
+
+        # A kpl of zero or less would break the price calculations
+        if not math.isfinite(self.kpl) or self.kpl <= 0:
+            raise StoreInvalidItem
+
+
+class CarColumns():
+    """
+    Stores cars as a list of names and an array of kpls rather than as a list
+    of car objects, which uses a lot less memory for big fleets. Cars are
+    created when they are asked for, so changing one won't change the store
+    """
+
+    __slots__ = ('names', 'kpls')
+
+    def __init__(self) -> None:
+        self.names: list[str] = []
+        self.kpls = array('d')
+
+    def append(self, car: Car) -> None:
+        # Interning means that cars with the same name share a string
+        self.names.append(sys.intern(car.name))
+        self.kpls.append(car.kpl)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def copy(self) -> 'CarColumns':
+        columns = CarColumns()
+        columns.names = self.names.copy()
+        columns.kpls = array('d', self.kpls)
+        return columns
+
+    @overload
+    def __getitem__(self, index: int) -> Car:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Car]:
+        ...
+
+    def __getitem__(self, index: int | slice) -> Car | list[Car]:
+        # Slicing gives a list of cars, the same as it would for a list
+        if isinstance(index, slice):
+            return [
+                Car(name, kpl)
+                for name, kpl in zip(self.names[index], self.kpls[index])
+            ]
+
+        return Car(self.names[index], self.kpls[index])
+
+    def __iter__(self) -> Iterator[Car]:
+        for name, kpl in zip(self.names, self.kpls):
+            yield Car(name, kpl)
+
+
+def parse_lines(data: bytes) -> tuple[list[str], array, int]:
+    """
+    Parses lines of car csv into a list of names and an array of kpls. Returns
+    the names, the kpls and the number of lines that couldn't be parsed
+    """
+
+    names: list[str] = []
+    kpls = array('d')
+    dead = 0
+
+    # Only split on newlines, the same as the journal is written.
+    # splitlines would also split names on characters like \x85 and \u2028.
+    # strip gets rid of the \r of a windows line ending
+    for line in data.decode('utf-8', errors='replace').split('\n'):
+        line = line.strip()
+
+        # Blank lines (like the one at the end of the file) are harmless
+        if not line:
+            continue
+
+        # Split off the kpl from the end so names with commas still work
+        name, _comma, kpl = line.rpartition(',')
+        name = name.strip()
+
+        try:
+            kpl = float(kpl)
+        except ValueError:
+            # Missing or broken kpl
+            dead += 1
+            continue
+
+        # The same as Car.validate, a kpl of zero or less (or nan or inf)
+        # would break the price calculations
+        if not math.isfinite(kpl) or kpl <= 0:
+            dead += 1
+            continue
+
+        # A line with no comma or nothing before it doesn't have a name
+        if not name:
+            dead += 1
+            continue
+
+        names.append(name)
+        kpls.append(kpl)
+
+    return names, kpls, dead
+
+
+def parse_chunk(location: str, start: int,
+                end: int) -> tuple[list[str], array, int]:
+    """
+    Parses the bytes between start and end of a car csv file. Used by the
+    process pool in load_columns
+    """
+
+    with open(location, 'rb') as table:
+        with mmap.mmap(table.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return parse_lines(data[start:end])
+
+
+def find_line_end(location: str) -> int:
+    """
+    Returns how many bytes of a file come before the end of its last finished
+    line. Anything after that is a line that is still being written
+
+    throws: FileNotFoundError
+    """
+
+    with open(location, 'rb') as table:
+        # mmap can't map an empty file
+        if table.seek(0, os.SEEK_END) == 0:
+            return 0
+
+        with mmap.mmap(table.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return data.rfind(b'\n') + 1
+
+
+def load_columns(location: str = CAR_STORE_LOCATION,
+                 workers: int | None = None,
+                 size: int | None = None) -> tuple[list[str], array, int]:
+    """
+    Loads a car csv file into a list of names and an array of kpls. Large
+    files are split into chunks that end on a newline and parsed in a process
+    pool. Only the first size bytes are parsed if it is given. Returns the
+    names, the kpls and the number of lines that couldn't be parsed
+
+    throws: FileNotFoundError
+    """
+
+    if size is None:
+        size = os.path.getsize(location)
+
+    # mmap can't map an empty file
+    if size == 0:
+        return [], array('d'), 0
+
+    with open(location, 'rb') as table:
+        with mmap.mmap(table.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # Small files aren't worth the effort
+            if size < PARALLEL_LOAD_SIZE:
+                return parse_lines(data[:size])
+
+            # Work out where each chunk starts, moving each split point
+            # forward to the start of the next line
+            chunks = workers or os.cpu_count() or 1
+            starts = [0]
+
+            for i in range(1, chunks):
+                newline = data.find(b'\n', max(starts[-1], size * i // chunks))
+
+                if newline == -1:
+                    break
+
+                starts.append(newline + 1)
+
+            ends = starts[1:] + [size]
+
+    # Imported here because they are slow to import and most files never need
+    # them
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # The app loads the store from a worker thread. Forking a process that has
+    # other threads running can leave the child stuck on a lock that one of
+    # them was holding, so the workers are started fresh instead
+    with ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        results = pool.map(parse_chunk, repeat(location), starts, ends)
+
+        # Stitch the chunks back together in order
+        names: list[str] = []
+        kpls = array('d')
+        dead = 0
+
+        for chunk_names, chunk_kpls, chunk_dead in results:
+            names.extend(chunk_names)
+            kpls.extend(chunk_kpls)
+            dead += chunk_dead
+
+    return names, kpls, dead
+
+
+def write_snapshot(location: str, stat: os.stat_result, names: list[str],
+                   kpls: array, dead: int) -> None:
+    """
+    Saves parsed columns in a binary file so that they can be loaded without
+    parsing the csv again. The layout is the header, the kpls as doubles, the
+    offset of each name in the name blob and then the name blob itself, which
+    has a newline between each name
+    """
+
+    blob = '\n'.join(names).encode('utf-8')
+
+    # Where each name starts in the blob, plus where the last one ends
+    offsets = array('Q', [0])
+    for name in names:
+        offsets.append(offsets[-1] + len(name.encode('utf-8')) + 1)
+
+    kpls = array('d', kpls)
+
+    # The file is always little endian
+    if sys.byteorder == 'big':
+        kpls.byteswap()
+        offsets.byteswap()
+
+    temp_location = location + '.tmp'
+
+    with open(temp_location, 'wb') as snapshot:
+        snapshot.write(SNAPSHOT_MAGIC)
+        snapshot.write(
+            SNAPSHOT_HEADER.pack(stat.st_size, stat.st_mtime_ns, len(names),
+                                 dead, len(blob)))
+        snapshot.write(kpls.tobytes())
+        snapshot.write(offsets.tobytes())
+        snapshot.write(blob)
+
+    # Never leave half a snapshot behind
+    os.replace(temp_location, location)
+
+
+def read_snapshot(location: str,
+                  stat: os.stat_result) -> tuple[list[str], array, int] | None:
+    """
+    Loads the columns from a snapshot file if it was made from a csv with the
+    same size and modified time. Returns None if it is missing, out of date or
+    broken
+    """
+
+    try:
+        with open(location, 'rb') as snapshot:
+            with mmap.mmap(snapshot.fileno(), 0,
+                           access=mmap.ACCESS_READ) as data:
+                header_end = len(SNAPSHOT_MAGIC) + SNAPSHOT_HEADER.size
+
+                if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+                    return None
+
+                size, mtime, count, dead, blob_size = SNAPSHOT_HEADER.unpack(
+                    data[len(SNAPSHOT_MAGIC):header_end])
+
+                # The csv has changed since the snapshot was made
+                if size != stat.st_size or mtime != stat.st_mtime_ns:
+                    return None
+
+                kpls_end = header_end + count * 8
+                blob_start = kpls_end + (count + 1) * 8
+
+                if len(data) != blob_start + blob_size:
+                    return None
+
+                kpls = array('d')
+                kpls.frombytes(data[header_end:kpls_end])
+
+                if sys.byteorder == 'big':
+                    kpls.byteswap()
+
+                # Decoding the blob in one go is much quicker than slicing out
+                # each name with the offsets
+                names = data[blob_start:].decode('utf-8').split('\n')
+
+                if count == 0:
+                    names = []
+
+                return names, kpls, dead
+    except (OSError, ValueError, struct.error):
+        # mmap can't map an empty file, and anything else means it is broken
+        return None
+
+
+class StorageBackend(ABC):
+    """
+    The base for each way of saving cars. The car store keeps the cars in
+    memory and uses a backend to read them in and write changes out
+    """
+
+    @abstractmethod
+    def load(self) -> tuple[list[str], array, int]:
+        """
+        Implemented by child classes, returns the names and kpls of every car
+        that has been saved along with the number of entries that couldn't be
+        read
+
+        throws: FileNotFoundError
+        """
+
+        pass
+
+    @abstractmethod
+    def append(self, cars: list[Car], durable: bool) -> None:
+        """
+        Implemented by child classes, saves some new cars. If durable is set
+        they need to be on the disk before this returns, otherwise the backend
+        can wait and do it with a later batch
+        """
+
+        pass
+
+    @abstractmethod
+    def rewrite(self, cars: Iterable[Car]) -> None:
+        """
+        Implemented by child classes, replaces everything that is saved with
+        the given cars
+        """
+
+        pass
+
+    def changes(self) -> tuple[list[str], array, int] | None:
+        """
+        Returns the names and kpls of any cars that other programs have saved
+        since the last load, along with the number of entries that couldn't
+        be read. Returns None if the saved cars were replaced, in which case
+        everything needs to be loaded again
+        """
+
+        return [], array('d'), 0
+
+    def sync(self) -> None:
+        """
+        Forces any saved cars onto the disk
+        """
+
+        pass
+
+    def close(self) -> None:
+        """
+        Syncs and lets go of any open files
+        """
+
+        self.sync()
+
+
+class CsvBackend(StorageBackend):
+    """
+    Saves cars to a csv file, with a car on each line. New cars are appended
+    to the end of the file and it is only rewritten when it is compacted.
+
+    When snapshot is set, the parsed file is cached in a binary snapshot next
+    to it which is used instead of the csv until the csv changes
+    """
+
+    def __init__(self,
+                 location: str = CAR_STORE_LOCATION,
+                 snapshot: bool = True) -> None:
+        self.location = location
+        self.snapshot_location = location + '.snapshot' if snapshot else None
+
+        # The file handle used for appending. Opened on the first append
+        self.__journal = None
+        # Appends that have been written but not fsynced yet
+        self.__unsynced = 0
+        # If the file was cut off half way through a line we need to start
+        # the next append on a fresh line
+        self.__needs_newline = False
+
+        # How much of the file has been read, and which file it was. Used to
+        # only read what other programs add to the end. The file is None
+        # until there is one
+        self.__offset = 0
+        self.__identity: tuple[int, int] | None = None
+
+    def load(self) -> tuple[list[str], array, int]:
+        # Forget the old file in case this one is missing
+        self.__offset = 0
+        self.__identity = None
+
+        # The last line might still be being written by another program, so
+        # only read up to the end of the last finished line and leave the rest
+        # for changes to pick up. The file can only have grown by the time we
+        # stat it
+        end = find_line_end(self.location)
+
+        stat = os.stat(self.location)
+        columns = None
+
+        self.__offset = end
+        self.__identity = (stat.st_dev, stat.st_ino)
+
+        if self.snapshot_location is not None:
+            columns = read_snapshot(self.snapshot_location, stat)
+
+        if columns is None:
+            columns = load_columns(self.location, size=end)
+
+            # Save the parsed file so next time is quicker. The snapshot is
+            # only a cache, so it doesn't matter if we can't write it
+            if self.snapshot_location is not None:
+                try:
+                    write_snapshot(self.snapshot_location, stat, *columns)
+                except OSError:
+                    pass
+
+        # If the file doesn't end with a newline, a crash might have cut off
+        # the last line part way through
+        self.__needs_newline = end < stat.st_size
+
+        return columns
+
+    def append(self, cars: list[Car], durable: bool) -> None:
+        # Open the file for appending the first time we need it
+        if self.__journal is None:
+            self.__journal = open(self.location, 'a')
+
+            # We might have just created the file. Anything already in it
+            # that we haven't read is picked up by changes
+            if self.__identity is None:
+                stat = os.fstat(self.__journal.fileno())
+                self.__identity = (stat.st_dev, stat.st_ino)
+
+        # Finish off a line that was cut off so we don't glue onto it
+        if self.__needs_newline:
+            self.__journal.write('\n')
+            self.__needs_newline = False
+
+        # Only write the new cars to the end of the file
+        self.__journal.flush()
+        before = os.fstat(self.__journal.fileno()).st_size
+        self.__journal.write(''.join(car.to_csv() + '\n' for car in cars))
+        self.__journal.flush()
+
+        # Skip over our own cars when looking for changes. If someone else
+        # has written since we last looked, we have to read ours again to
+        # get to theirs
+        if before == self.__offset:
+            self.__offset = os.fstat(self.__journal.fileno()).st_size
+
+        # fsync is slow, so only do it every so often
+        self.__unsynced += 1
+        if durable or self.__unsynced >= SYNC_EVERY:
+            self.sync()
+
+    def changes(self) -> tuple[list[str], array, int] | None:
+        try:
+            stat = os.stat(self.location)
+        except FileNotFoundError:
+            # Still missing is no change, but a file we read has gone
+            if self.__identity is None:
+                return [], array('d'), 0
+
+            self.close()
+            return None
+
+        # A different file has been renamed over ours, or it has been cut
+        # short. Either way what we read before can't be trusted
+        if ((stat.st_dev, stat.st_ino) != self.__identity
+                or stat.st_size < self.__offset):
+            # The append handle might point at the old file
+            self.close()
+            return None
+
+        if stat.st_size == self.__offset:
+            return [], array('d'), 0
+
+        with open(self.location, 'rb') as table:
+            table.seek(self.__offset)
+            tail = table.read(stat.st_size - self.__offset)
+
+        # The last line might still be being written, so leave it for next
+        # time
+        end = tail.rfind(b'\n') + 1
+        self.__offset += end
+
+        return parse_lines(tail[:end])
+
+    def sync(self) -> None:
+        if self.__journal is not None and self.__unsynced > 0:
+            self.__journal.flush()
+            os.fsync(self.__journal.fileno())
+
+        self.__unsynced = 0
+
+    def close(self) -> None:
+        self.sync()
+
+        if self.__journal is not None:
+            self.__journal.close()
+            self.__journal = None
+
+    def rewrite(self, cars: Iterable[Car]) -> None:
+        """
+        Rewrites the whole file. The new contents is written to a temporary
+        file and renamed over the old one so a crash can never leave us with
+        half a file
+        """
+
+        # The append handle points at the old file, which is about to go away
+        self.close()
+
+        temp_location = self.location + '.tmp'
+
+        with open(temp_location, 'w') as table:
+            # Write each car to the temporary file
+            table.writelines(car.to_csv() + '\n' for car in cars)
+
+            # Make sure that it is actually on the disk before we swap it in
+            table.flush()
+            os.fsync(table.fileno())
+
+        # Renaming is atomic, so the file is either all old or all new
+        os.replace(temp_location, self.location)
+
+        self.__needs_newline = False
+
+        # We have read everything in the new file, because we wrote it
+        stat = os.stat(self.location)
+        self.__offset = stat.st_size
+        self.__identity = (stat.st_dev, stat.st_ino)
+
+
+class QueryBackend(StorageBackend):
+    """
+    The base for backends that can answer questions about the cars
+    themselves. A car store using one of these doesn't load the cars into
+    memory, it passes each question on to the backend instead. The methods
+    match the ones on StoreSnapshot
+    """
+
+    @abstractmethod
+    def count(self) -> int:
+        """
+        Implemented by child classes, returns the number of cars
+        """
+
+        pass
+
+    @abstractmethod
+    def iter_cars(self) -> Iterator[Car]:
+        """
+        Implemented by child classes, goes through every car in the order
+        they were added
+        """
+
+        pass
+
+    @abstractmethod
+    def get_car(self, name: str) -> Car | None:
+        pass
+
+    @abstractmethod
+    def get_by_kpl(self, low: float, high: float) -> list[Car]:
+        pass
+
+    @abstractmethod
+    def count_over(self, coefficient: float, threshold: float) -> int:
+        pass
+
+    @abstractmethod
+    def get_over(self, coefficient: float, threshold: float) -> list[Car]:
+        pass
+
+    @abstractmethod
+    def get_by_price(self, start: int, count: int) -> list[Car]:
+        pass
+
+    @abstractmethod
+    def search(self, prefix: str, limit: int) -> list[Car]:
+        pass
+
+    @abstractmethod
+    def summary(self) -> dict:
+        pass
+
+    @abstractmethod
+    def total_cost(self, coefficient: float) -> float:
+        pass
+
+    def get_cars(self, names: list[str]) -> list[Car | None]:
+        return [self.get_car(name) for name in names]
+
+
+class SqliteBackend(QueryBackend):
+    """
+    Saves cars to a SQLite database. Names are unique regardless of
+    capitalization, and the database answers questions about the fleet
+    without loading it into memory
+    """
+
+    def __init__(self, location: str = SQLITE_STORE_LOCATION) -> None:
+        # Imported here so that the default csv store doesn't pay for it
+        import sqlite3
+
+        self.location = location
+
+        # The store can be used from worker threads, so the connection is
+        # shared and only used by one thread at a time
+        self.connection = sqlite3.connect(location, check_same_thread=False)
+        self.__lock = threading.Lock()
+
+        # WAL lets other programs read the database while we write to it
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS cars (id INTEGER PRIMARY KEY, '
+                'name TEXT NOT NULL, kpl REAL NOT NULL)')
+            self.connection.execute(
+                'CREATE UNIQUE INDEX IF NOT EXISTS cars_name '
+                'ON cars (name COLLATE NOCASE)')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS cars_kpl ON cars (kpl)')
+
+    def __query(self, sql: str, parameters: tuple = ()) -> list[tuple]:
+        """
+        Runs a query and returns every row
+        """
+
+        with self.__lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def __cars(self, sql: str, parameters: tuple = ()) -> list[Car]:
+        """
+        Runs a query that selects the name and kpl and returns them as cars
+        """
+
+        return [Car(name, kpl) for name, kpl in self.__query(sql, parameters)]
+
+    def load(self) -> tuple[list[str], array, int]:
+        names: list[str] = []
+        kpls = array('d')
+
+        for car in self.iter_cars():
+            names.append(car.name)
+            kpls.append(car.kpl)
+
+        # The database won't store anything it can't read back
+        return names, kpls, 0
+
+    def append(self, cars: list[Car], durable: bool) -> None:
+        # All of the cars go in as part of one transaction, which is
+        # committed straight away. Leaving it open would lock out other
+        # connections and lose the cars if we didn't close cleanly. With WAL
+        # a commit is cheap, so batches come from add_many instead
+        with self.__lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO cars (name, kpl) VALUES (?, ?)',
+                ((car.name, car.kpl) for car in cars))
+
+    def rewrite(self, cars: Iterable[Car]) -> None:
+        # Deleting and inserting in one transaction means that readers either
+        # see all of the old cars or all of the new ones
+        with self.__lock, self.connection:
+            self.connection.execute('DELETE FROM cars')
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO cars (name, kpl) VALUES (?, ?)',
+                ((car.name, car.kpl) for car in cars))
+
+    def sync(self) -> None:
+        # Everything is committed as it is written
+        with self.__lock:
+            self.connection.commit()
+
+    def close(self) -> None:
+        self.sync()
+        self.connection.close()
+
+    def count(self) -> int:
+        return self.__query('SELECT COUNT(*) FROM cars')[0][0]
+
+    def iter_cars(self, batch_size: int = 10_000) -> Iterator[Car]:
+        """
+        Goes through every car a batch at a time, so the whole fleet is never
+        in memory at once
+        """
+
+        # Each batch starts after the last id of the one before, so other
+        # queries can use the connection in between
+        last = 0
+
+        while rows := self.__query(
+                'SELECT id, name, kpl FROM cars WHERE id > ? '
+                'ORDER BY id LIMIT ?', (last, batch_size)):
+            for _id, name, kpl in rows:
+                yield Car(name, kpl)
+
+            last = rows[-1][0]
+
+    def get_car(self, name: str) -> Car | None:
+        """
+        Finds a car with the matching name without loading the fleet
+        """
+
+        cars = self.__cars(
+            'SELECT name, kpl FROM cars WHERE name = ? COLLATE NOCASE',
+            (name, ))
+
+        return cars[0] if cars else None
+
+    def get_by_kpl(self, low: float, high: float) -> list[Car]:
+        """
+        Returns the cars with a kpl between low and high (including both), in
+        order of kpl
+        """
+
+        return self.__cars(
+            'SELECT name, kpl FROM cars WHERE kpl BETWEEN ? AND ? '
+            'ORDER BY kpl, id', (low, high))
+
+    def count_over(self, coefficient: float, threshold: float) -> int:
+        """
+        Returns how many cars cost more than the threshold on a route. The
+        coefficient comes from Route.get_cost_coefficient
+        """
+
+        # The kpl bound lets SQLite use the kpl index, the division then makes
+        # sure that the cars near the bound are counted the same way as
+        # everywhere else
+        return self.__query(
+            'SELECT COUNT(*) FROM cars WHERE kpl <= ? AND ? / kpl > ?',
+            (coefficient / threshold * (1 + 1e-9), coefficient,
+             threshold))[0][0]
+
+    def get_over(self, coefficient: float, threshold: float) -> list[Car]:
+        """
+        Returns the cars that cost more than the threshold on a route, most
+        expensive first
+        """
+
+        return self.__cars(
+            'SELECT name, kpl FROM cars WHERE kpl <= ? AND ? / kpl > ? '
+            'ORDER BY kpl, id',
+            (coefficient / threshold * (1 + 1e-9), coefficient, threshold))
+
+    def get_by_price(self, start: int, count: int) -> list[Car]:
+        """
+        Returns a page of cars sorted from cheapest to most expensive to drive,
+        which is the same on every route. start is the position of the first
+        car on the page
+        """
+
+        # The kpl index also holds the id, so this reads the page straight
+        # out of the index
+        return self.__cars(
+            'SELECT name, kpl FROM cars ORDER BY kpl DESC, id DESC '
+            'LIMIT ? OFFSET ?', (count, start))
+
+    def search(self, prefix: str, limit: int) -> list[Car]:
+        """
+        Returns up to limit cars whose names start with prefix, in alphabetical
+        order. Capitalization doesn't matter
+        """
+
+        # Every name starting with the prefix sorts between the prefix and the
+        # prefix followed by the last character there is, which lets SQLite
+        # use the name index. LIKE can't, because the column isn't NOCASE
+        return self.__cars(
+            'SELECT name, kpl FROM cars WHERE name >= ? COLLATE NOCASE '
+            'AND name < ? COLLATE NOCASE ORDER BY name COLLATE NOCASE '
+            'LIMIT ?', (prefix, prefix + chr(sys.maxunicode), limit))
+
+    def get_kpl_percentile(self, percent: float) -> float:
+        """
+        Returns the nearest rank percentile of the kpls, read from the kpl
+        index
+        """
+
+        count = self.count()
+
+        if count == 0:
+            return 0.0
+
+        index = min(max(math.ceil(percent / 100 * count) - 1, 0), count - 1)
+        return self.__query(
+            'SELECT kpl FROM cars ORDER BY kpl LIMIT 1 OFFSET ?',
+            (index, ))[0][0]
+
+    def summary(self) -> dict:
+        """
+        Returns the number of cars, the lowest, highest and mean kpl, the kpl
+        percentiles and the kpl histogram as a list of (low, high, count), the
+        same as StoreSnapshot.summary
+        """
+
+        count, mean = self.__query('SELECT COUNT(*), AVG(kpl) FROM cars')[0]
+
+        # The last bin also holds every car past the end
+        histogram = [0] * HISTOGRAM_BINS
+
+        for slot, cars in self.__query(
+                'SELECT MIN(CAST(kpl / ? AS INTEGER), ?) AS slot, COUNT(*) '
+                'FROM cars GROUP BY slot',
+            (HISTOGRAM_WIDTH, HISTOGRAM_BINS - 1)):
+            histogram[slot] = cars
+
+        return {
+            'count': count,
+            'min_kpl': self.get_kpl_percentile(0),
+            'max_kpl': self.get_kpl_percentile(100),
+            'mean_kpl': mean or 0.0,
+            'percentiles': {
+                percent: self.get_kpl_percentile(percent)
+                for percent in (10, 50, 90)
+            },
+            'histogram': [(i * HISTOGRAM_WIDTH, (i + 1) * HISTOGRAM_WIDTH,
+                           cars) for i, cars in enumerate(histogram)],
+        }
+
+    def total_cost(self, coefficient: float) -> float:
+        """
+        Returns the cost of driving every car on a route. The coefficient
+        comes from Route.get_cost_coefficient
+        """
+
+        return coefficient * (self.__query(
+            'SELECT SUM(1.0 / kpl) FROM cars')[0][0] or 0.0)
+
+
+def migrate(source: StorageBackend, target: StorageBackend) -> int:
+    """
+    Copies every car from one backend to another, replacing whatever the
+    target had. Returns the number of cars that were copied
+    """
+
+    names, kpls, _dead = source.load()
+
+    # Skip any duplicates, keeping the first copy like the store does
+    seen: set[str] = set()
+    cars: list[Car] = []
+
+    for name, kpl in zip(names, kpls):
+        if name.lower() not in seen:
+            seen.add(name.lower())
+            cars.append(Car(name, kpl))
+
+    target.rewrite(cars)
+    target.sync()
+
+    return len(cars)
+
+
+class FleetStats():
+    """
+    Running totals for the fleet that are kept up to date as cars are added,
+    so questions about the whole fleet don't need a pass over every car
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_kpl = 0.0
+
+        # The cost of a car on a route is the route's coefficient / kpl, so
+        # the cost of the whole fleet is the coefficient * this
+        self.total_inverse_kpl = 0.0
 
-class StoreDuplicateItem(Exception):
-    pass
+        self.histogram = [0] * HISTOGRAM_BINS
 
+    def add(self, kpl: float) -> None:
+        self.count += 1
+        self.total_kpl += kpl
+        self.total_inverse_kpl += 1 / kpl
+        self.histogram[min(int(kpl / HISTOGRAM_WIDTH),
+                           HISTOGRAM_BINS - 1)] += 1
 
-class Car():
+    def copy(self) -> 'FleetStats':
+        stats = FleetStats()
+        stats.count = self.count
+        stats.total_kpl = self.total_kpl
+        stats.total_inverse_kpl = self.total_inverse_kpl
+        stats.histogram = self.histogram.copy()
+        return stats
+
+    def mean_kpl(self) -> float:
+        return self.total_kpl / self.count if self.count else 0.0
+
+    def total_cost(self, coefficient: float) -> float:
+        """
+        Returns the cost of driving every car on a route. The coefficient
+        comes from Route.get_cost_coefficient
+        """
+
+        return coefficient * self.total_inverse_kpl
+
+
+class ReadWriteLock():
     """
-    A class used to store all of the values for a car and keep intelisense happy
+    Lets any number of threads read at the same time, or a single thread
+    write. Writers that are waiting go before any new readers so that a
+    steady stream of readers can't keep them waiting forever. Not reentrant.
+
+    Used as `with lock.reading:` or `with lock.writing:`
     """
 
-    name: str
-    kpl: float
+    def __init__(self) -> None:
+        self.__condition = threading.Condition(threading.Lock())
+        self.__readers = 0
+        self.__writing = False
+        self.__waiting_writers = 0
 
-    def __init__(self, name: str, kpl: float) -> None:
-        self.name = name
-        self.kpl = kpl
+        # Plain classes are quicker to enter than @contextmanager, which
+        # matters for something as small as get_car
+        self.reading = LockSide(self.acquire_read, self.release_read)
+        self.writing = LockSide(self.acquire_write, self.release_write)
 
-    def to_csv(self) -> str:
-        return f'{self.name},{self.kpl}'
+    def acquire_read(self) -> None:
+        with self.__condition:
+            while self.__writing or self.__waiting_writers:
+                self.__condition.wait()
+
+            self.__readers += 1
+
+    def release_read(self) -> None:
+        with self.__condition:
+            self.__readers -= 1
+
+            # The last reader out lets the writers in
+            if not self.__readers:
+                self.__condition.notify_all()
+
+    def acquire_write(self) -> None:
+        with self.__condition:
+            self.__waiting_writers += 1
+
+            while self.__writing or self.__readers:
+                self.__condition.wait()
+
+            self.__waiting_writers -= 1
+            self.__writing = True
+
+    def release_write(self) -> None:
+        with self.__condition:
+            self.__writing = False
+            self.__condition.notify_all()
+
+
+class LockSide():
+    """
+    One side of a ReadWriteLock, used with a with statement
+    """
+
+    def __init__(self, acquire: Callable[[], None],
+                 release: Callable[[], None]) -> None:
+        self.acquire = acquire
+        self.release = release
+
+    def __enter__(self) -> None:
+        self.acquire()
+
+    def __exit__(self, *args) -> None:
+        self.release()
+
+
+class StoreSnapshot():
+    """
+    The cars in a store along with the indexes used to search them.
+
+    The store hands these out as read only snapshots. Once one has been
+    handed out the store never changes it again, it changes a copy instead,
+    so a snapshot can be read from any thread without locking
+    """
+
+    def __init__(self, cars: list[Car] | CarColumns) -> None:
+        self.cars = cars
+
+        # Lookup table from the lowercase name of each car to its position in
+        # the list. This lets us find cars without looping through the entire
+        # list
+        self.positions: dict[str, int] = {}
+
+        # Every car's kpl in ascending order, along with the car's position in
+        # the list. Because a car's cost on a route only goes down as its kpl
+        # goes up, this lets us find all of the cars over a price with a
+        # binary search
+        self.sorted_kpls = array('d')
+        self.kpl_order = array('q')
+
+        # Every car's lowercase name in alphabetical order. All of the names
+        # that start with the same letters are next to each other, so a binary
+        # search finds them for the search box
+        self.sorted_names: list[str] = []
+
+        # Totals for the whole fleet, updated as each car is added
+        self.stats = FleetStats()
+
+    def copy(self) -> 'StoreSnapshot':
+        snapshot = StoreSnapshot(self.cars.copy())
+        snapshot.positions = self.positions.copy()
+        snapshot.sorted_kpls = array('d', self.sorted_kpls)
+        snapshot.kpl_order = array('q', self.kpl_order)
+        snapshot.sorted_names = self.sorted_names.copy()
+        snapshot.stats = self.stats.copy()
+
+        return snapshot
+
+    def append(self, car: Car) -> None:
+        """
+        Adds a car to the list and the name index. The sorted indexes are
+        left for the caller to update
+        """
+
+        self.positions[car.name.lower()] = len(self.cars)
+        self.cars.append(car)
+        self.stats.add(car.kpl)
+
+    def index(self) -> None:
+        """
+        Rebuilds all of the indexes and totals from the list of cars
+        """
+
+        self.positions.clear()
+        self.stats = FleetStats()
+
+        for position, car in enumerate(self.cars):
+            # Capitalization shouldn't mater. If there are two cars with the
+            # same name, the first one wins, just like the old linear search
+            self.positions.setdefault(car.name.lower(), position)
+            self.stats.add(car.kpl)
+
+        self.index_kpls()
+        self.index_names()
+
+    def index_kpls(self) -> None:
+        """
+        Rebuilds the sorted kpl index from the list of cars
+        """
+
+        kpls = [car.kpl for car in self.cars]
+        order = sorted(range(len(kpls)), key=kpls.__getitem__)
+
+        del self.sorted_kpls[:]
+        del self.kpl_order[:]
+        self.sorted_kpls.extend(kpls[position] for position in order)
+        self.kpl_order.extend(order)
+
+    def index_names(self) -> None:
+        """
+        Rebuilds the sorted name index from the name index
+        """
+
+        self.sorted_names[:] = sorted(self.positions)
+
+    def index_car(self, position: int) -> None:
+        """
+        Adds a single car to the sorted indexes
+        """
+
+        car = self.cars[position]
+
+        # Goes after any cars with the same kpl to keep them in the order they
+        # were added
+        slot = bisect_right(self.sorted_kpls, car.kpl)
+        self.sorted_kpls.insert(slot, car.kpl)
+        self.kpl_order.insert(slot, position)
+
+        insort(self.sorted_names, car.name.lower())
+
+    def get(self) -> Sequence[Car]:
+        """
+        Returns the list of cars
+        """
+        return self.cars
+
+    def get_kpl_percentile(self, percent: float) -> float:
+        """
+        Returns the nearest rank percentile of the kpls. The kpls are already
+        sorted, so it is exact and doesn't need to look at every car
+        """
+
+        if not self.sorted_kpls:
+            return 0.0
+
+        index = math.ceil(percent / 100 * len(self.sorted_kpls)) - 1
+        return self.sorted_kpls[min(max(index, 0), len(self.sorted_kpls) - 1)]
+
+    def summary(self) -> dict:
+        """
+        Returns the number of cars, the lowest, highest and mean kpl, the kpl
+        percentiles and the kpl histogram as a list of (low, high, count)
+        """
+
+        return {
+            'count': self.stats.count,
+            'min_kpl': self.get_kpl_percentile(0),
+            'max_kpl': self.get_kpl_percentile(100),
+            'mean_kpl': self.stats.mean_kpl(),
+            'percentiles': {
+                percent: self.get_kpl_percentile(percent)
+                for percent in (10, 50, 90)
+            },
+            'histogram': [(i * HISTOGRAM_WIDTH, (i + 1) * HISTOGRAM_WIDTH,
+                           count)
+                          for i, count in enumerate(self.stats.histogram)],
+        }
+
+    def total_cost(self, coefficient: float) -> float:
+        """
+        Returns the cost of driving every car on a route. The coefficient
+        comes from Route.get_cost_coefficient
+        """
+
+        return self.stats.total_cost(coefficient)
+
+    def get_by_kpl(self, low: float, high: float) -> list[Car]:
+        """
+        Returns the cars with a kpl between low and high (including both), in
+        order of kpl
+        """
+
+        start = bisect_left(self.sorted_kpls, low)
+        end = bisect_right(self.sorted_kpls, high)
+
+        return [self.cars[i] for i in self.kpl_order[start:end]]
+
+    def count_over(self, coefficient: float, threshold: float) -> int:
+        """
+        Returns how many cars cost more than the threshold on a route. The
+        coefficient comes from Route.get_cost_coefficient
+        """
+
+        # The cost (coefficient / kpl) goes down as the kpl goes up, so the
+        # cars over the threshold are all at the start of the sorted kpls
+        return bisect_left(self.sorted_kpls,
+                           True,
+                           key=lambda kpl: coefficient / kpl <= threshold)
+
+    def get_over(self, coefficient: float, threshold: float) -> list[Car]:
+        """
+        Returns the cars that cost more than the threshold on a route, most
+        expensive first. The coefficient comes from Route.get_cost_coefficient
+        """
+
+        end = self.count_over(coefficient, threshold)
+        return [self.cars[i] for i in self.kpl_order[:end]]
+
+    def get_by_price(self, start: int, count: int) -> list[Car]:
+        """
+        Returns a page of cars sorted from cheapest to most expensive to drive,
+        which is the same on every route. start is the position of the first
+        car on the page
+        """
+
+        # The cheapest car has the highest kpl, which is at the end
+        end = max(len(self.kpl_order) - start, 0)
+        first = max(end - count, 0)
+
+        return [self.cars[i] for i in reversed(self.kpl_order[first:end])]
+
+    def get_car(self, name: str) -> Car | None:
+        """
+        Finds a car with the matching name
+        """
+
+        # Capitalization shouldn't mater
+        position = self.positions.get(name.lower())
+
+        if position is None:
+            return None
+
+        return self.cars[position]
+
+    def get_cars(self, names: list[str]) -> list[Car | None]:
+        """
+        Finds the cars matching each of the names. Cars that don't exist are
+        returned as None so the results line up with the names passed in
+        """
+
+        return [self.get_car(name) for name in names]
+
+    def search(self, prefix: str, limit: int) -> list[Car]:
+        """
+        Returns up to limit cars whose names start with prefix, in alphabetical
+        order. Capitalization doesn't matter
+        """
+
+        prefix = prefix.lower()
+        start = bisect_left(self.sorted_names, prefix)
+
+        matches = []
+
+        # Everything starting with the prefix comes straight after it
+        for name in self.sorted_names[start:start + limit]:
+            if not name.startswith(prefix):
+                break
+
+            matches.append(self.cars[self.positions[name]])
+
+        return matches
 
 
 class CarStore():
     """
     This is responsible for loading and storing cars whilst allowing for us to
-    make changes without introducing bugs
+    make changes without introducing bugs.
+
+    A store can be shared between threads. Any number of threads can read
+    from it at once, while changes to the cars and the backend happen one at
+    a time.
+
+    If the backend can answer questions itself (a QueryBackend, like SQLite)
+    the cars aren't loaded into memory at all, every question is passed on to
+    the backend
     """
 
-    __cars: list[Car] = []
+    def __init__(self,
+                 append_only: bool = True,
+                 columnar: bool = False,
+                 backend: StorageBackend | None = None) -> None:
+        # Where the cars are saved. Defaults to ./cars.csv
+        self.backend = backend if backend is not None else CsvBackend()
+
+        # Set when the backend answers the questions instead of the cars in
+        # memory
+        self.__queries = (self.backend if isinstance(
+            self.backend, QueryBackend) else None)
+
+        # When append_only is set, each add only writes the new car rather
+        # than rewriting everything
+        self.append_only = append_only
+
+        # When columnar is set, cars are stored as columns to save memory
+        self.columnar = columnar
+
+        # The cars and their indexes
+        self.__data = self.__empty()
+
+        # Set once the data has been handed out as a snapshot. It belongs to
+        # the readers from then on, so the next change is made to a copy
+        self.__shared = False
+
+        self.__lock = ReadWriteLock()
+
+        # Goes up every time the cars change so that anything remembering
+        # results about them knows to throw them away
+        self.version = 0
+
+        # Entries in the backend that load had to skip
+        self.__dead_lines = 0
 
-    def __init__(self) -> None:
         self.load()
 
+    def __empty(self) -> StoreSnapshot:
+        return StoreSnapshot(CarColumns() if self.columnar else [])
+
+    def __writable(self) -> StoreSnapshot:
+        """
+        Returns the cars so they can be changed, copying them first if a
+        snapshot is using them. Only call this while holding the write lock
+        """
+
+        if self.__shared:
+            self.__data = self.__data.copy()
+            self.__shared = False
+
+        return self.__data
+
+    def __view(self) -> StoreSnapshot | QueryBackend:
+        """
+        Returns whatever answers questions about the cars, either the backend
+        or the cars in memory. Only call this while holding the lock
+        """
+
+        if self.__queries is not None:
+            return self.__queries
+
+        return self.__data
+
+    def snapshot(self) -> StoreSnapshot:
+        """
+        Returns a read only view of the cars as they are right now. It won't
+        change when cars are added, so it can be read from any thread without
+        holding the lock.
+
+        When the backend answers the questions, this has to read every car
+        from it
+        """
+
+        with self.__lock.reading:
+            if self.__queries is not None:
+                data = self.__empty()
+
+                for car in self.__queries.iter_cars():
+                    data.cars.append(car)
+
+                data.index()
+                return data
+
+            self.__shared = True
+            return self.__data
+
     def load(self):
+        """
+        Throws away the cars in memory and loads them again from the backend
+        """
+
+        with self.__lock.writing:
+            self.__load()
+
+    def __load(self):
+        # Start again from scratch. Snapshots keep the old cars
+        data = self.__data = self.__empty()
+        self.__shared = False
+        self.__dead_lines = 0
+
+        # The backend is asked for the cars when they are needed
+        if self.__queries is not None:
+            self.version += 1
+            return
+
         # If the car file doesn't exist, we want to handle this gracefully rather
         # than crashing
         try:
-            with open(CAR_STORE_LOCATION, 'r') as table:
-                # All of the cars stored
-                cars = table.readlines()
-
-                for car in cars:
-                    # Split the car into its parts
-                    name, kpl = car.split(',')
-
-                    # Create a new car. Note that we are avoiding self.add()
-                    # to reduce IO throughput, which might be a touch slow on
-                    # some computers (Cough, windows, cough, dos, cough)
-                    self.__cars.append(Car(name, float(kpl)))
+            # All of the cars stored
+            names, kpls, dead = self.backend.load()
+
+            # Half written lines need to be cleaned up when we next compact
+            self.__dead_lines += dead
+
+            # Names we have already seen while replaying the file
+            seen: set[str] = set()
+
+            for name, kpl in zip(names, kpls):
+                # The first copy of a car wins, anything after it is a
+                # leftover that compaction will remove
+                if name.lower() in seen:
+                    self.__dead_lines += 1
+                    continue
+                seen.add(name.lower())
+
+                # Create a new car. Note that we are avoiding self.add()
+                # to reduce IO throughput, which might be a touch slow on
+                # some computers (Cough, windows, cough, dos, cough)
+                data.cars.append(Car(name, kpl))
+
+            # Build the index once everything has been loaded
+            data.index()
+            self.version += 1
         except FileNotFoundError:
             # Console log for debugging. If the user is opening the program for
             # the first time, I expect that they will stumble accross the add
@@ -60,43 +1433,317 @@ class CarStore():
             print(
                 'Try adding cars using the "Add a car" option in the dropdown')
 
+        # Clean up the file if replaying it left too much junk behind
+        if self.__dead_lines > COMPACT_THRESHOLD:
+            self.__compact()
+
+    def reload(self) -> list[Car] | None:
+        """
+        Picks up cars that other programs have saved since the store was
+        loaded. Only the new entries are read. Returns the cars that were
+        added, or None if everything had to be loaded again because the saved
+        cars were replaced
+        """
+
+        with self.__lock.writing:
+            # Questions always go to the backend, so there is nothing to pick
+            # up
+            if self.__queries is not None:
+                return []
+
+            changes = self.backend.changes()
+
+            if changes is None:
+                self.__load()
+                return None
+
+            names, kpls, dead = changes
+            self.__dead_lines += dead
+
+            data = self.__writable()
+            added: list[Car] = []
+
+            for name, kpl in zip(names, kpls):
+                # The same as load, the first copy of a car wins
+                if name.lower() in data.positions:
+                    self.__dead_lines += 1
+                    continue
+
+                car = Car(name, kpl)
+                data.append(car)
+                added.append(car)
+
+            if not added:
+                return added
+
+            # A few cars are quicker to slot in, lots are quicker to sort again
+            if len(added) > RELOAD_SORT_SIZE:
+                data.index_kpls()
+                data.index_names()
+            else:
+                for position in range(len(data.cars) - len(added),
+                                      len(data.cars)):
+                    data.index_car(position)
+
+            self.version += 1
+
+            return added
+
     def add(self, car: Car) -> None:
         """
         Adds a car to the store and saves it to the disk
 
-        throws: StoreDuplicateItem
+        throws: StoreDuplicateItem, StoreInvalidItem
         """
 
-        # If the car has the same name as another car, we should throw an error
-        if self.get_car(car.name) != None:
-            raise StoreDuplicateItem
+        # Check the car before anything is changed, so a bad car can't leave
+        # the indexes half updated
+        car.validate()
 
-        # Add the car to the internal array so that the program can use it latter
-        self.__cars.append(car)
+        with self.__lock.writing:
+            # If the car has the same name as another car, we should throw an
+            # error
+            if self.__view().get_car(car.name) != None:
+                raise StoreDuplicateItem
 
-        # Create a place to store the new csv contents
-        new_csv = ""
+            # The backend keeps the cars, so all it needs is the new one
+            if self.__queries is not None:
+                self.__queries.append([car], durable=False)
+                self.version += 1
+                return
 
-        # Write each car to the csv string
-        for car in self.get():
-            new_csv += car.to_csv() + "\n"
+            # Add the car to the internal array so that the program can use it
+            # latter
+            data = self.__writable()
+            data.append(car)
+            data.index_car(len(data.cars) - 1)
+            self.version += 1
 
-        # Write that car to disk
-        with open(CAR_STORE_LOCATION, 'w') as table:
-            table.write(new_csv)
+            if not self.append_only:
+                # Write every car to disk
+                self.__compact()
+                return
 
-    def get(self) -> list[Car]:
+            # Only save the new car. The backend syncs it with a later batch
+            self.backend.append([car], durable=False)
+
+    def add_many(self, cars: Iterable[Car]) -> tuple[int, int]:
         """
-        Returns the list of cars
+        Adds lots of cars to the store and saves them to the disk in one write.
+        Cars that are invalid or have the same name as a car in the store (or
+        earlier in the batch) are skipped. Returns the number of cars that
+        were added and the number that were skipped
+        """
+
+        with self.__lock.writing:
+            if self.__queries is not None:
+                return self.__add_many_to_backend(self.__queries, cars)
+
+            data = self.__writable()
+            added: list[Car] = []
+            skipped = 0
+
+            for car in cars:
+                try:
+                    car.validate()
+                except StoreInvalidItem:
+                    skipped += 1
+                    continue
+
+                # The index is updated as we go, so this also catches
+                # duplicates inside of the batch
+                if car.name.lower() in data.positions:
+                    skipped += 1
+                    continue
+
+                data.append(car)
+                added.append(car)
+
+            if not added:
+                return 0, skipped
+
+            # Sorting everything again is quicker than inserting lots of cars
+            # one at a time
+            data.index_kpls()
+            data.index_names()
+            self.version += 1
+
+            if not self.append_only:
+                # Write every car to disk
+                self.__compact()
+                return len(added), skipped
+
+            # Save the whole batch at once and make sure it is on the disk
+            self.backend.append(added, durable=True)
+
+            return len(added), skipped
+
+    def __add_many_to_backend(self, backend: QueryBackend,
+                              cars: Iterable[Car]) -> tuple[int, int]:
+        """
+        The same as add_many, but checks for duplicates with the backend
+        instead of the cars in memory. Only call this while holding the write
+        lock
+        """
+
+        # Lowercase names in the batch, to catch duplicates inside of it
+        names: set[str] = set()
+        added: list[Car] = []
+        skipped = 0
+
+        for car in cars:
+            try:
+                car.validate()
+            except StoreInvalidItem:
+                skipped += 1
+                continue
+
+            if (car.name.lower() in names
+                    or backend.get_car(car.name) is not None):
+                skipped += 1
+                continue
+
+            names.add(car.name.lower())
+            added.append(car)
+
+        if added:
+            backend.append(added, durable=True)
+            self.version += 1
+
+        return len(added), skipped
+
+    def sync(self) -> None:
+        """
+        Forces any added cars onto the disk
+        """
+
+        with self.__lock.writing:
+            self.backend.sync()
+
+    def close(self) -> None:
+        """
+        Syncs and closes the backend
+        """
+
+        with self.__lock.writing:
+            self.backend.close()
+
+    def compact(self) -> None:
+        """
+        Rewrites everything in the backend with only the cars that are in the
+        store
+        """
+
+        with self.__lock.writing:
+            self.__compact()
+
+    def __compact(self) -> None:
+        # There are no cars in memory to write, the backend already has them
+        if self.__queries is not None:
+            return
+
+        self.backend.rewrite(self.__data.cars)
+        self.__dead_lines = 0
+
+    def __len__(self) -> int:
+        with self.__lock.reading:
+            if self.__queries is not None:
+                return self.__queries.count()
+
+            return len(self.__data.cars)
+
+    def get(self) -> Sequence[Car]:
+        """
+        Returns the list of cars. The list won't change if cars are added
+        afterwards
+        """
+
+        # Reading the cars straight out of the backend skips building the
+        # indexes that a snapshot would have
+        if self.__queries is not None:
+            with self.__lock.reading:
+                return list(self.__queries.iter_cars())
+
+        return self.snapshot().get()
+
+    def get_by_kpl(self, low: float, high: float) -> list[Car]:
+        """
+        Returns the cars with a kpl between low and high (including both), in
+        order of kpl
+        """
+
+        with self.__lock.reading:
+            return self.__view().get_by_kpl(low, high)
+
+    def count_over(self, coefficient: float, threshold: float) -> int:
+        """
+        Returns how many cars cost more than the threshold on a route. The
+        coefficient comes from Route.get_cost_coefficient
+        """
+
+        with self.__lock.reading:
+            return self.__view().count_over(coefficient, threshold)
+
+    def get_over(self, coefficient: float, threshold: float) -> list[Car]:
+        """
+        Returns the cars that cost more than the threshold on a route, most
+        expensive first. The coefficient comes from Route.get_cost_coefficient
+        """
+
+        with self.__lock.reading:
+            return self.__view().get_over(coefficient, threshold)
+
+    def get_by_price(self, start: int, count: int) -> list[Car]:
         """
-        return self.__cars
+        Returns a page of cars sorted from cheapest to most expensive to drive,
+        which is the same on every route. start is the position of the first
+        car on the page
+        """
+
+        with self.__lock.reading:
+            return self.__view().get_by_price(start, count)
 
-    def get_car(self, name: str) -> Car:
+    def get_car(self, name: str) -> Car | None:
         """
         Finds a car with the matching name
         """
 
-        for car in self.get():
-            # Capitalization shouldn't mater
-            if car.name.lower() == name.lower():
-                return car
\ No newline at end of file
+        with self.__lock.reading:
+            return self.__view().get_car(name)
+
+    def get_cars(self, names: list[str]) -> list[Car | None]:
+        """
+        Finds the cars matching each of the names. Cars that don't exist are
+        returned as None so the results line up with the names passed in
+        """
+
+        with self.__lock.reading:
+            return self.__view().get_cars(names)
+
+    def summary(self) -> dict:
+        """
+        Returns the number of cars, the lowest, highest and mean kpl, the kpl
+        percentiles and the kpl histogram. Read from running totals, or worked
+        out by the backend, so the cars are never loaded to answer it
+        """
+
+        with self.__lock.reading:
+            return self.__view().summary()
+
+    def total_cost(self, coefficient: float) -> float:
+        """
+        Returns the cost of driving every car on a route. The coefficient
+        comes from Route.get_cost_coefficient
+        """
+
+        with self.__lock.reading:
+            return self.__view().total_cost(coefficient)
+
+    def search(self, prefix: str, limit: int) -> list[Car]:
+        """
+        Returns up to limit cars whose names start with prefix, in alphabetical
+        order. Capitalization doesn't matter
+        """
+
+        with self.__lock.reading:
+            return self.__view().search(prefix, limit)
@@ -0,0 +1,131 @@
+import threading
+from collections import OrderedDict
+from typing import Sequence
+
+from cars import Car, CarStore
+from roads import Route, get_cost_matrix
+
+# The most costs that the cache will remember before it starts forgetting the
+# ones that were used longest ago
+COST_CACHE_SIZE = 100_000
+
+
+class CostCache():
+    """
+    Remembers the cost of driving a car on a route at a fuel price so that it
+    doesn't need to be worked out again. Everything is forgotten when the car
+    store changes or a different fuel price is used
+    """
+
+    def __init__(self,
+                 car_store: CarStore,
+                 maxsize: int = COST_CACHE_SIZE) -> None:
+        self.car_store = car_store
+        self.maxsize = maxsize
+
+        # Keyed by (car name, route name, fuel price). The order is how
+        # recently each cost was used, oldest first
+        self.__costs: OrderedDict[tuple[str, str, float],
+                                  float] = OrderedDict()
+
+        # What the costs were calculated against
+        self.__version = car_store.version
+        self.__fuel_price: float | None = None
+
+        # Counters to see how well the cache is doing
+        self.hits = 0
+        self.misses = 0
+
+        # The cache is used by the background calculations as well as the
+        # main thread
+        self.__lock = threading.RLock()
+
+    def clear(self) -> None:
+        """
+        Forgets every cost. The hit and miss counters are kept
+        """
+
+        with self.__lock:
+            self.__costs.clear()
+
+    def check(self, fuel_price: float) -> None:
+        """
+        Clears the cache if the cars or the fuel price have changed since the
+        costs were calculated
+        """
+
+        if (self.__version != self.car_store.version
+                or self.__fuel_price != fuel_price):
+            self.clear()
+            self.__version = self.car_store.version
+            self.__fuel_price = fuel_price
+
+    def get_cost(self, car: Car, route: Route, fuel_price: float) -> float:
+        """
+        Returns the cost of driving a car on a route
+        """
+
+        return self.get_costs([car], route, fuel_price)[0]
+
+    def get_costs(self, cars: Sequence[Car], route: Route,
+                  fuel_price: float) -> list[float]:
+        """
+        Returns the cost of driving each car on a route. Any costs that aren't
+        cached are calculated together in one go
+        """
+
+        with self.__lock:
+            return self.__get_costs(cars, route, fuel_price)
+
+    def __get_costs(self, cars: Sequence[Car], route: Route,
+                    fuel_price: float) -> list[float]:
+        self.check(fuel_price)
+
+        route_name = route.get_name()
+        costs: list[float] = []
+
+        # Where each missing cost needs to go in the results
+        missing: list[int] = []
+
+        for car in cars:
+            key = (car.name.lower(), route_name, fuel_price)
+            cost = self.__costs.get(key)
+
+            if cost is None:
+                missing.append(len(costs))
+                costs.append(0.0)
+            else:
+                # Mark it as recently used
+                self.__costs.move_to_end(key)
+                costs.append(cost)
+
+        self.hits += len(costs) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            # Calculate all of the missing costs at once
+            missed, _over = get_cost_matrix([cars[i].kpl for i in missing],
+                                            [route], fuel_price)
+
+            for i, row in zip(missing, missed):
+                cost = float(row[0])
+                costs[i] = cost
+                self.__costs[(cars[i].name.lower(), route_name,
+                              fuel_price)] = cost
+
+            # Forget the oldest costs if there are too many
+            while len(self.__costs) > self.maxsize:
+                self.__costs.popitem(last=False)
+
+        return costs
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the hit and miss counters along with the size of the cache
+        """
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.__costs),
+        }
@@ -0,0 +1,189 @@
+import cProfile
+import json
+import time
+from collections import deque
+from functools import wraps
+
+from cars import CarStore
+from costs import CostCache
+from roads import Route
+from sweep import percentile
+
+# How many of the latest timings are kept for working out percentiles
+SAMPLE_SIZE = 10_000
+
+
+class Timer():
+    """
+    Counts the calls to a function and remembers how long the latest ones
+    took
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total_ns = 0
+        self.samples: deque[int] = deque(maxlen=SAMPLE_SIZE)
+
+    def record(self, duration_ns: int) -> None:
+        self.calls += 1
+        self.total_ns += duration_ns
+        self.samples.append(duration_ns)
+
+    def summary(self) -> dict[str, float]:
+        """
+        Returns the number of calls, the total time and the latency
+        percentiles, all in milliseconds
+        """
+
+        samples = sorted(self.samples)
+
+        return {
+            'calls': self.calls,
+            'total_ms': self.total_ns / 1e6,
+            'p50_ms': percentile(samples, 50) / 1e6,
+            'p90_ms': percentile(samples, 90) / 1e6,
+            'p99_ms': percentile(samples, 99) / 1e6,
+        }
+
+
+# The methods that can be instrumented as (class, method name, label)
+HOOKS: list[tuple[type, str, str]] = []
+
+# A timer for each label
+TIMERS: dict[str, Timer] = {}
+
+# The original methods, stored while the instrumented ones are in place
+_originals: dict[tuple[type, str], object] = {}
+
+# Set while a cProfile is running
+_profile: cProfile.Profile | None = None
+
+
+def register(owner: type, name: str, label: str) -> None:
+    """
+    Adds a method to the list of ones that are timed when instrumentation is
+    turned on
+    """
+
+    HOOKS.append((owner, name, label))
+    TIMERS.setdefault(label, Timer())
+
+    # Methods registered after instrumentation was turned on are timed
+    # straight away
+    if _originals:
+        wrap(owner, name, label)
+
+
+def wrap(owner: type, name: str, label: str) -> None:
+    original = getattr(owner, name)
+    timer = TIMERS[label]
+
+    @wraps(original)
+    def timed(*args, **kwargs):
+        start = time.perf_counter_ns()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            timer.record(time.perf_counter_ns() - start)
+
+    _originals[(owner, name)] = original
+    setattr(owner, name, timed)
+
+
+def is_enabled() -> bool:
+    return bool(_originals)
+
+
+def enable() -> None:
+    """
+    Starts timing the registered methods. The methods are swapped for timed
+    versions, so they cost nothing extra while this is off
+    """
+
+    if is_enabled():
+        return
+
+    for owner, name, label in HOOKS:
+        wrap(owner, name, label)
+
+
+def disable() -> None:
+    """
+    Puts the original methods back
+    """
+
+    for (owner, name), original in _originals.items():
+        setattr(owner, name, original)
+
+    _originals.clear()
+
+
+def reset() -> None:
+    """
+    Throws away everything that has been recorded
+    """
+
+    for label in TIMERS:
+        TIMERS[label] = Timer()
+
+    # The timed methods hold on to the old timers, so wrap them again
+    if is_enabled():
+        disable()
+        enable()
+
+
+def summary() -> dict[str, dict[str, float]]:
+    """
+    Returns the summary of every timer
+    """
+
+    return {label: timer.summary() for label, timer in TIMERS.items()}
+
+
+def export_json(location: str) -> None:
+    """
+    Writes the summary of every timer to a json file
+    """
+
+    with open(location, 'w') as output:
+        json.dump(summary(), output, indent=2)
+
+
+def start_profile() -> None:
+    """
+    Starts a cProfile of everything the program does
+    """
+
+    global _profile
+
+    if _profile is None:
+        _profile = cProfile.Profile()
+        _profile.enable()
+
+
+def stop_profile(location: str) -> None:
+    """
+    Stops the cProfile and dumps it to a file that can be opened with pstats
+    or snakeviz
+    """
+
+    global _profile
+
+    if _profile is not None:
+        _profile.disable()
+        _profile.dump_stats(location)
+        _profile = None
+
+
+def is_profiling() -> bool:
+    return _profile is not None
+
+
+register(CarStore, 'load', 'CarStore.load')
+register(CarStore, 'add', 'CarStore.add')
+register(CarStore, 'get_car', 'CarStore.get_car')
+register(Route, 'get_cost', 'Route.get_cost')
+# The table costs go through the cache, the cheapest car and route lookups
+# call Route.get_cost directly
+register(CostCache, 'get_cost', 'CostCache.get_cost')
+register(CostCache, 'get_costs', 'CostCache.get_costs')
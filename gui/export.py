@@ -0,0 +1,164 @@
+import argparse
+import contextlib
+import csv
+import gzip
+import io
+import json
+import sys
+from itertools import islice
+from typing import Callable, ContextManager, Iterable, Iterator, TextIO
+
+from cars import Car
+from roads import Route, get_cost_matrix
+
+# Price of fuel used when none is given
+PRICE = 1.48
+
+# How many cars are priced at a time. Only one chunk of rows is ever in
+# memory, however big the fleet is
+EXPORT_CHUNK_SIZE = 10_000
+
+# How many bytes are collected before they are written to the file
+BUFFER_SIZE = 1024 * 1024
+
+# The formats that a report can be written in
+FORMATS = ('csv', 'jsonl')
+
+# The columns of each row
+FIELDS = ('name', 'route', 'price', 'over')
+
+Row = tuple[str, str, float, bool]
+
+
+def cost_rows(cars: Iterable[Car],
+              routes: list[Route],
+              fuel_price: float,
+              threshold: float = 400) -> Iterator[list[Row]]:
+    """
+    Prices every car on every route, a chunk of cars at a time. Yields lists
+    of (name, route, price, over threshold) rows
+    """
+
+    names = [route.get_name() for route in routes]
+    cars = iter(cars)
+
+    while chunk := list(islice(cars, EXPORT_CHUNK_SIZE)):
+        costs, over = get_cost_matrix([car.kpl for car in chunk], routes,
+                                      fuel_price, threshold)
+
+        # float and bool turn NumPy's numbers into normal ones
+        yield [(car.name, name, float(cost), bool(expensive))
+               for car, car_costs, car_over in zip(chunk, costs, over)
+               for name, cost, expensive in zip(names, car_costs, car_over)]
+
+
+def guess_format(location: str) -> str:
+    """
+    Works out the format from the file name, ignoring any .gz on the end.
+    Anything that isn't .jsonl is written as csv
+    """
+
+    location = location.removesuffix('.gz')
+    return 'jsonl' if location.endswith('.jsonl') else 'csv'
+
+
+def open_output(location: str) -> ContextManager[TextIO]:
+    """
+    Opens a file to write a report to with one large buffer. Files ending in
+    .gz are compressed. '-' is standard output, which is left open
+    """
+
+    if location == '-':
+        return contextlib.nullcontext(sys.stdout)
+
+    # The text wrapper passes everything straight through to the one buffer
+    if location.endswith('.gz'):
+        raw = gzip.GzipFile(location, 'wb')
+    else:
+        raw = io.FileIO(location, 'w')
+
+    return io.TextIOWrapper(io.BufferedWriter(raw, BUFFER_SIZE),
+                            encoding='utf-8',
+                            newline='',
+                            write_through=True)
+
+
+def write_csv(chunks: Iterable[list[Row]], output: TextIO) -> Iterator[int]:
+    writer = csv.writer(output)
+    writer.writerow(FIELDS)
+
+    for chunk in chunks:
+        writer.writerows(
+            (name, route, f'{price:.2f}', 'yes' if over else 'no')
+            for name, route, price, over in chunk)
+        yield len(chunk)
+
+
+def write_jsonl(chunks: Iterable[list[Row]], output: TextIO) -> Iterator[int]:
+    for chunk in chunks:
+        output.write(''.join(
+            json.dumps(dict(zip(FIELDS, row))) + '\n' for row in chunk))
+        yield len(chunk)
+
+
+def export(location: str,
+           cars: Iterable[Car],
+           routes: list[Route],
+           fuel_price: float,
+           threshold: float = 400,
+           format: str | None = None,
+           progress: Callable[[int], None] | None = None) -> int:
+    """
+    Writes the cost of every car on every route to a file as csv or json
+    lines, compressed if the file ends in .gz. The format is guessed from the
+    file name if it isn't given. progress is called with the number of rows
+    written so far after each chunk. Returns the number of rows written
+
+    throws: OSError
+    """
+
+    if (format or guess_format(location)) == 'jsonl':
+        write = write_jsonl
+    else:
+        write = write_csv
+
+    written = 0
+
+    with open_output(location) as output:
+        for count in write(cost_rows(cars, routes, fuel_price, threshold),
+                           output):
+            written += count
+
+            if progress is not None:
+                progress(written)
+
+    return written
+
+
+if __name__ == "__main__":
+    from cars import CarStore
+    from roads import RouteCatalogue
+
+    parser = argparse.ArgumentParser(
+        description='Writes the cost of every car on every route to a file')
+    parser.add_argument('location',
+                        help='file to write, .gz to compress, - for stdout')
+    parser.add_argument('--price',
+                        type=float,
+                        default=PRICE,
+                        help='fuel price per litre')
+    parser.add_argument('--threshold',
+                        type=float,
+                        default=400,
+                        help='cost that counts as too expensive')
+    parser.add_argument('--format',
+                        choices=FORMATS,
+                        help='defaults to the file extension')
+    args = parser.parse_args()
+
+    rows = export(args.location,
+                  CarStore().snapshot().get(),
+                  RouteCatalogue.load().get(), args.price, args.threshold,
+                  args.format)
+
+    print(f'Exported {rows} rows', file=sys.stderr)
@@ -1,31 +1,149 @@
+import time
+
+# Started before anything else is imported so that the startup report can
+# include how long the imports took
+IMPORT_START = time.perf_counter()
+
+import math
+import queue
 import sys
+import threading
+from typing import Callable
 import tkinter as tk
-from tkinter import *
-from tkinter import ttk
-from tkinter.ttk import *
-
-from cars import CarStore, Car, StoreDuplicateItem
-from roads import Backroad, Highway, Route
+from tkinter import BooleanVar, StringVar, Tk, filedialog, ttk
+from tkinter.ttk import (Button, Checkbutton, Entry, Frame, Label, OptionMenu,
+                         Progressbar)
+
+import diagnostics
+from cars import (CarStore, Car, StoreDuplicateItem, StoreInvalidItem,
+                  parse_lines)
+from costs import CostCache
+from export import export
+from prices import (FilePriceProvider, HttpPriceProvider, PricePoller,
+                    PriceProvider)
+from roads import Backroad, Route, RouteCatalogue
+from sweep import PERCENTILES, price_range, sweep
 
 PRICE = 1.48
 """
-Global price of fuel
+Price of fuel used until the price feed says otherwise
+"""
+
+IMPORT_CHUNK_SIZE = 1024 * 1024
+"""
+How many bytes of a file are imported before the progress bar is updated
+"""
+
+CALCULATE_CHUNK_SIZE = 10_000
+"""
+How many cars are priced at a time before the results are shown
+"""
+
+SEARCH_LIMIT = 20
+"""
+How many matching cars the search box shows
+"""
+
+SEARCH_DELAY = 150
+"""
+How many milliseconds to wait after the user stops typing before searching
+"""
+
+RELOAD_INTERVAL = 1000
+"""
+How many milliseconds to wait between checking cars.csv for new cars
+"""
+
+IMPORT_TIME = time.perf_counter() - IMPORT_START
+"""
+How long it took to import everything the app needs
 """
 
 
+def get_option(flag: str) -> str | None:
+    """
+    Returns the value given after a command line flag, or None if the flag
+    wasn't given. A flag at the very end with no value is ignored
+    """
+
+    if flag not in sys.argv:
+        return None
+
+    position = sys.argv.index(flag) + 1
+
+    if position >= len(sys.argv):
+        print(f"{flag} needs a value, ignoring it")
+        return None
+
+    return sys.argv[position]
+
+
+def get_startup_budget() -> float | None:
+    """
+    Returns the number of seconds given with --startup-budget, or None if it
+    wasn't given. Anything that isn't a positive number of seconds is ignored
+    """
+
+    value = get_option("--startup-budget")
+
+    if value is None:
+        return None
+
+    try:
+        budget = float(value)
+    except ValueError:
+        budget = math.nan
+
+    if not math.isfinite(budget) or budget <= 0:
+        print(f"--startup-budget needs a number of seconds, ignoring {value}")
+        return None
+
+    return budget
+
+
 class Table(Frame):
     """
     A simple table viewer implemented using a significant amount of jank
     """
 
-    # Stores all of the rows that will be rendered
-    __rows: list[list[str]] = []
+    def __init__(self, *args, **kwargs) -> None:
+        Frame.__init__(self, *args, **kwargs)
+
+        # Stores all of the rows that will be rendered
+        self.__rows: list[list[str]] = []
+
+        # Labels that have already been created, keyed by their (row, column).
+        # Creating and destroying Tk widgets is slow, so we keep them around
+        # and change their text instead
+        self.__labels: dict[tuple[int, int], tk.Label] = {}
+
+        # Labels created by write()
+        self.__messages: list[Label] = []
+
+        # The colors that a label has before we turn it into a header
+        self.__default_colors: tuple[str, str] | None = None
 
     def add_row(self, row: list[str]) -> None:
         # Append and rerender
         self.__rows.append(row)
         self.render()
 
+    def add_rows(self, rows: list[list[str]]) -> None:
+        """
+        Appends a bunch of rows and only renders once at the end
+        """
+
+        self.__rows.extend(rows)
+        self.render()
+
+    def set_rows(self, rows: list[list[str]]) -> None:
+        """
+        Replaces all of the rows in the table and renders them once
+        """
+
+        self.__rows = list(rows)
+        self.render()
+
     def clear(self):
         """
         Clears all of the contents of the grid
@@ -39,13 +157,41 @@ class Table(Frame):
         Hides the contents of the grid. THE CONTENTS IS STILL STORED
         """
 
-        for widget in self.winfo_children():
-            widget.grid_remove()
-            widget.destroy()
+        # Hide the labels but keep them so render can reuse them
+        for label in self.__labels.values():
+            label.grid_remove()
+
+        for message in self.__messages:
+            message.destroy()
+        self.__messages = []
+
+    def get_label(self, x: int, y: int) -> tk.Label:
+        """
+        Returns the label for a cell, creating it if it doesn't exist yet
+        """
+
+        label = self.__labels.get((y, x))
+
+        if label is None:
+            # We need to use tk labels, rather than ttk labels to set the
+            # background color
+            label = tk.Label(self)
+            self.__labels[(y, x)] = label
+
+            if self.__default_colors is None:
+                self.__default_colors = (label['background'],
+                                         label['foreground'])
+
+        return label
 
     def render(self):
-        # Start with a blank slate
-        self.render_clear()
+        # Get rid of any messages, the labels are reused below
+        for message in self.__messages:
+            message.destroy()
+        self.__messages = []
+
+        # Every cell that is used by this render
+        used: set[tuple[int, int]] = set()
 
         # Loop through all of the columns
         for y, row in enumerate(self.__rows):
@@ -59,26 +205,183 @@ class Table(Frame):
 
             # Add all of the row items
             for x, column in enumerate(row):
-                # We need to use tk labels, rather than ttk labels to set the
-                # background color
-                label = tk.Label(self, text=column.capitalize(), font=font)
+                label = self.get_label(x, y)
+                label.configure(text=column.capitalize(), font=font)
 
                 # Give the table headers a background color.
                 # FIXME: This just ignores the system dark theme
                 if y == 0:
-                    label['background'] = '#d3d3d3'
-                    label['foreground'] = '#000000'
+                    label.configure(background='#d3d3d3', foreground='#000000')
+                else:
+                    background, foreground = self.__default_colors
+                    label.configure(background=background,
+                                    foreground=foreground)
 
                 # Add the label to the grid
                 label.grid(row=y, column=x, sticky="nswe")
+                used.add((y, x))
+
+        # Hide any labels left over from a bigger table
+        for cell, label in self.__labels.items():
+            if cell not in used:
+                label.grid_remove()
 
     def write(self, text=""):
         # Write a label to the end of the grid with no particular regard for
         # formatting.
 
-        length = len(self.winfo_children())
+        length = len(self.__rows) + len(self.__messages)
         label = Label(self, text=text)
         label.grid(row=length, column=0, sticky="nswe")
+        self.__messages.append(label)
+
+
+class VirtualTable(Frame):
+    """
+    A table for very large amounts of rows. Rather than creating a widget for
+    every cell, it only shows the rows that are on screen and asks a row
+    provider for them as the user scrolls
+    """
+
+    def __init__(self, master, columns: list[str], rows=25, **kwargs) -> None:
+        Frame.__init__(self, master, **kwargs)
+
+        # How many rows are shown at once
+        self.rows = rows
+
+        # The total number of rows and the function used to get each one
+        self.__count = 0
+        self.__get_row: Callable[[int], list[str]] | None = None
+
+        # The index of the first row on screen
+        self.__offset = 0
+
+        # The treeview only ever holds the rows that are visible
+        self.tree = ttk.Treeview(self,
+                                 columns=columns,
+                                 show='headings',
+                                 selectmode='none',
+                                 height=rows)
+        self.set_columns(columns)
+
+        # We can't let the treeview control the scrollbar because it doesn't
+        # know about the rows that haven't been created
+        self.scrollbar = ttk.Scrollbar(self,
+                                       orient='vertical',
+                                       command=self.scroll)
+
+        self.tree.grid(row=0, column=0, sticky='nswe')
+        self.scrollbar.grid(row=0, column=1, sticky='ns')
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        # Windows and macOS send MouseWheel, linux sends button 4 and 5
+        self.tree.bind('<MouseWheel>', self.wheel)
+        self.tree.bind('<Button-4>', lambda _event: self.scroll_by(-3))
+        self.tree.bind('<Button-5>', lambda _event: self.scroll_by(3))
+
+    def set_columns(self, columns: list[str]) -> None:
+        """
+        Changes the columns shown in the table
+        """
+
+        self.tree['columns'] = columns
+
+        for column in columns:
+            self.tree.heading(column, text=column)
+
+    def set_provider(self, count: int,
+                     get_row: Callable[[int], list[str]] | None) -> None:
+        """
+        Sets the number of rows and the function that returns the row at a
+        given index. The function is only called for rows that are on screen
+        """
+
+        self.__count = count
+        self.__get_row = get_row
+        self.__offset = 0
+        self.render()
+
+    def set_count(self, count: int) -> None:
+        """
+        Changes the number of rows without scrolling back to the top. Used when
+        more rows are available from the same provider
+        """
+
+        self.__count = count
+
+        # Scrolling by nothing keeps the offset inside the table if it shrank
+        self.scroll_by(0)
+
+    def clear(self) -> None:
+        """
+        Removes all of the rows from the table
+        """
+
+        self.set_provider(0, None)
+
+    def scroll_by(self, rows: int) -> None:
+        """
+        Moves the visible rows up or down
+        """
+
+        # Stop at the top and bottom of the table
+        last = max(0, self.__count - self.rows)
+        self.__offset = min(max(0, self.__offset + rows), last)
+        self.render()
+
+    def wheel(self, event) -> None:
+        """
+        Scrolls a few rows at a time with the mouse wheel
+        """
+
+        self.scroll_by(-3 if event.delta > 0 else 3)
+
+    def scroll(self, action: str, amount: str, unit: str = 'units') -> None:
+        """
+        Called by the scrollbar when it is dragged or clicked
+        """
+
+        if action == 'moveto':
+            # Dragging the scrollbar gives us a fraction of the whole table
+            self.scroll_by(int(float(amount) * self.__count) - self.__offset)
+        elif unit == 'pages':
+            self.scroll_by(int(amount) * self.rows)
+        else:
+            self.scroll_by(int(amount))
+
+    def render(self) -> None:
+        # Only the rows that fit on screen
+        visible = max(0, min(self.rows, self.__count - self.__offset))
+        items = self.tree.get_children()
+
+        for i in range(visible):
+            values = [
+                column.capitalize()
+                for column in self.__get_row(self.__offset + i)
+            ]
+
+            # Reuse the existing items rather than recreating them
+            if i < len(items):
+                self.tree.item(items[i], values=values)
+            else:
+                self.tree.insert('', 'end', values=values)
+
+        # Remove any items that are no longer needed
+        if len(items) > visible:
+            self.tree.delete(*items[visible:])
+
+        # Show how far through the table we are
+        if self.__count == 0:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.__offset / self.__count,
+                               (self.__offset + visible) / self.__count)
+
+
+# The tables can be timed along with the store and the cost cache
+diagnostics.register(Table, 'render', 'Table.render')
+diagnostics.register(VirtualTable, 'render', 'VirtualTable.render')
 
 
 class AppStateEnum():
@@ -90,24 +393,237 @@ class AppStateEnum():
     INDIVIDUAL_CAR = "Individual car"
     ALL_CARS = "All cars"
     INPUT_CAR = "Add a car"
+    IMPORT_CARS = "Import cars"
+    PRICE_SWEEP = "Fuel price sweep"
+    FLEET_SUMMARY = "Fleet summary"
+    DIAGNOSTICS = "Diagnostics"
 
-    ALL = [SELECT, INDIVIDUAL_CAR, ALL_CARS, INPUT_CAR]
+    ALL = [
+        SELECT, INDIVIDUAL_CAR, ALL_CARS, INPUT_CAR, IMPORT_CARS, PRICE_SWEEP,
+        FLEET_SUMMARY, DIAGNOSTICS
+    ]
 
 
 class App(Tk):
     def __init__(self):
         Tk.__init__(self)
 
-        self.car_store = CarStore()
+        # How long each part of starting up took, in seconds
+        self.startup_timings: dict[str, float] = {"import": IMPORT_TIME}
+        self.__startup_start = time.perf_counter()
+
+        # Loading the cars can take a while for big fleets, so it happens in
+        # the background while the window opens. These are None until then
+        self.car_store: CarStore | None = None
+        self.cost_cache: CostCache | None = None
+        self.__loaded_store: CarStore | None = None
+        self.__store_loaded = threading.Event()
+
+        # Set if the cars couldn't be loaded, so it can be shown to the user
+        self.store_error: Exception | None = None
+
+        # Set once the startup report has been printed, so it only happens once
+        self.__startup_reported = False
+
+        # How long starting is allowed to take, read now so a bad value is
+        # reported straight away
+        self.startup_budget = get_startup_budget()
+
+        self.routes = RouteCatalogue.load()
+
+        # Set to stop the calculation that is running in the background
+        self.calculation: threading.Event | None = None
+
+        # The current price of fuel. The poller checks the feed on another
+        # thread and hands new prices over through the queue
+        self.fuel_price = PRICE
+        self.__prices: queue.Queue[float] = queue.Queue()
+        self.price_poller = PricePoller(self.get_price_provider(),
+                                        self.__prices.put)
+
+        # Set by the current view to update what it shows when the price
+        # changes
+        self.on_price_change: Callable[[], None] | None = None
+
+        # Set by the current view to show cars that other programs have added
+        # to the store while we are running
+        self.on_cars_added: Callable[[list[Car]], None] | None = None
 
         self.build_structure()
 
+        self.price_poller.start()
+        self.after(200, self.check_price)
+
+        threading.Thread(target=self.load_store, daemon=True).start()
+        self.after(20, self.check_store)
+
+        # Runs once tk has drawn everything that was created above
+        self.after_idle(self.first_paint)
+
+    def load_store(self) -> None:
+        """
+        Loads the car store. Runs on a separate thread
+        """
+
+        start = time.perf_counter()
+
+        # --store picks a different file, a .db file is opened with SQLite.
+        # Imported here so it loads in the background
+        from migrate import open_backend
+
+        location = get_option("--store")
+
+        # Anything that goes wrong is passed on to check_store, otherwise the
+        # app would wait for the cars forever
+        try:
+            backend = open_backend(location) if location is not None else None
+            self.__loaded_store = CarStore(backend=backend)
+        except Exception as error:
+            self.store_error = error
+        finally:
+            self.startup_timings["store load"] = time.perf_counter() - start
+            self.__store_loaded.set()
+
+    def check_store(self) -> None:
+        """
+        Waits for the car store to load, then shows whatever was waiting for it
+        """
+
+        if not self.__store_loaded.is_set():
+            self.after(20, self.check_store)
+            return
+
+        if self.store_error is not None:
+            print(f"Couldn't load the cars: {self.store_error!r}")
+
+            # Show the error instead of "Loading cars..."
+            if self.state.get() != AppStateEnum.SELECT:
+                self.update()
+
+            self.startup_finished()
+            return
+
+        self.car_store = self.__loaded_store
+        self.cost_cache = CostCache(self.car_store)
+
+        # Rebuild the current view now that it has some cars
+        if self.state.get() != AppStateEnum.SELECT:
+            self.update()
+
+        # Start watching for cars added by other programs
+        self.after(RELOAD_INTERVAL, self.check_cars)
+
+        self.startup_finished()
+
+    def check_cars(self) -> None:
+        """
+        Picks up any cars that other programs have added to the store since we
+        last looked. Only the new part of the file is read
+        """
+
+        added = self.car_store.reload()
+
+        if added is None:
+            # Everything changed, so the view has to start again
+            self.update()
+        elif added and self.on_cars_added is not None:
+            self.on_cars_added(added)
+
+        self.after(RELOAD_INTERVAL, self.check_cars)
+
+    def get_price_provider(self) -> PriceProvider:
+        """
+        Picks where the fuel price comes from. Defaults to ./price.txt, which
+        just keeps the starting price if it doesn't exist
+        """
+
+        url = get_option("--price-url")
+        if url is not None:
+            return HttpPriceProvider(url)
+
+        location = get_option("--price-file")
+        if location is not None:
+            return FilePriceProvider(location)
+
+        return FilePriceProvider()
+
+    def check_price(self) -> None:
+        """
+        Picks up new prices from the poller. Tk isn't thread safe, so this
+        runs on the main thread
+        """
+
+        price = None
+
+        # Only the latest price matters
+        while not self.__prices.empty():
+            price = self.__prices.get()
+
+        if price is not None:
+            self.set_fuel_price(price)
+
+        self.after(200, self.check_price)
+
+    def set_fuel_price(self, price: float) -> None:
+        """
+        Changes the price of fuel and lets the current view update the results
+        it is showing
+        """
+
+        if price == self.fuel_price:
+            return
+
+        self.fuel_price = price
+        self.price_label['text'] = f"Fuel: ${price:.2f}/L"
+
+        if self.on_price_change is not None:
+            self.on_price_change()
+
+    def first_paint(self) -> None:
+        self.startup_timings["first paint"] = (time.perf_counter() -
+                                               self.__startup_start)
+        self.startup_finished()
+
+    def startup_finished(self) -> None:
+        """
+        Called after the first paint and after the store loads. Once both have
+        happened, prints the startup report if it was asked for
+        """
+
+        # The store thread can finish before the first paint, in which case
+        # both callers get here with everything recorded. Only report once
+        if (self.__startup_reported
+                or "first paint" not in self.startup_timings
+                or not self.__store_loaded.is_set()):
+            return
+
+        self.__startup_reported = True
+
+        self.startup_timings["total"] = time.perf_counter() - IMPORT_START
+
+        budget = self.startup_budget
+
+        if "--startup-report" in sys.argv or budget is not None:
+            for phase, seconds in self.startup_timings.items():
+                print(f"{phase}: {seconds * 1000:.1f}ms")
+
+        # Close straight away and fail if starting took too long. Used to keep
+        # an eye on startup time
+        if budget is not None:
+            over = self.startup_timings["total"] > budget
+
+            if over:
+                print(f"Startup took longer than the {budget}s budget")
+
+            self.quit(1 if over else 0)
+
     def build_structure(self) -> None:
         # Basic grid structure that will be constructed
         #
         # |------------------------|--------------------------------------|
         # | |--------------------| | self.results                         |
         # | | self.sidebar_stack | |                                      |
+        # | | self.price_label   | |                                      |
         # | | self.quit_button   | |                                      |
         # | |--------------------| |                                      |
         # |------------------------|--------------------------------------|
@@ -137,16 +653,29 @@ class App(Tk):
         self.sidebar_stack = Frame(self.sidebar_frame)
         self.sidebar_stack.grid(row=1, column=0, sticky='nwe')
 
+        # Shows the price of fuel that everything is calculated with
+        self.price_label = Label(self.sidebar_frame,
+                                 text=f"Fuel: ${self.fuel_price:.2f}/L")
+        self.price_label.grid(row=2, column=0, sticky='ew')
+
         # Create the quit button and give it the self.destroy method
         self.quit_button = Button(self.sidebar_frame,
                                   text="Quit",
                                   command=self.destroy)
-        self.quit_button.grid(row=2, column=0, sticky='sew')
+        self.quit_button.grid(row=3, column=0, sticky='sew')
 
         # Create a table to output the results
         self.results = Table(self)
         self.results.grid(row=0, column=1)
 
+        # Create a table for showing calculations. It only draws the rows on
+        # screen, so it can hold the entire fleet. It shares the same spot as
+        # self.results and only one is shown at a time
+        self.virtual_results = VirtualTable(self,
+                                            ["Name", "Price", "Over $400"])
+        self.virtual_results.grid(row=0, column=1, sticky="nswe")
+        self.virtual_results.grid_remove()
+
         # It works. Don't touch it. No clue what it does, but it works
         self.sidebar_frame.grid_rowconfigure(1, weight=1)
         self.grid_columnconfigure(1, weight=1)
@@ -158,14 +687,58 @@ class App(Tk):
     def update(self, *args) -> None:
         # HACK: Takes in *args to stop annoying type errors
 
+        # Stop any calculations for the old state
+        self.cancel_calculation()
+        self.on_price_change = None
+        self.on_cars_added = None
+
         # Clear all of the elements that shouldn't persist
         for widget in self.sidebar_stack.winfo_children():
             widget.destroy()
         self.results.clear()
+        self.virtual_results.clear()
 
         # Grab the state for easy access
         state = self.state.get()
 
+        # Everything other than the select and diagnostics screens needs the
+        # cars. The view is rebuilt by check_store once they have loaded
+        if (state not in (AppStateEnum.SELECT, AppStateEnum.DIAGNOSTICS)
+                and self.car_store is None):
+            self.virtual_results.grid_remove()
+            self.results.grid()
+            if self.store_error is None:
+                self.results.write("Loading cars...")
+            else:
+                self.results.write(
+                    f"Couldn't load the cars: {self.store_error}")
+            return
+
+        # The calculation views use the virtual table, everything else uses the
+        # normal one
+        if state in (AppStateEnum.INDIVIDUAL_CAR, AppStateEnum.ALL_CARS):
+            self.results.grid_remove()
+            self.virtual_results.set_columns(["Name", "Price", "Over $400"])
+            self.virtual_results.grid()
+        elif state == AppStateEnum.PRICE_SWEEP:
+            self.results.grid_remove()
+            self.virtual_results.set_columns(
+                ["Fuel price", "Route", "Total", "Over $400"] +
+                [f"{percent}th percentile" for percent in PERCENTILES])
+            self.virtual_results.grid()
+        elif state == AppStateEnum.FLEET_SUMMARY:
+            self.results.grid_remove()
+            self.virtual_results.set_columns(["Statistic", "Value"])
+            self.virtual_results.grid()
+        elif state == AppStateEnum.DIAGNOSTICS:
+            self.results.grid_remove()
+            self.virtual_results.set_columns(
+                ["Function", "Calls", "Total", "50th", "90th", "99th"])
+            self.virtual_results.grid()
+        else:
+            self.virtual_results.grid_remove()
+            self.results.grid()
+
         # Run the appropriate method for the state
         if state == AppStateEnum.INDIVIDUAL_CAR:
             self.update_individual_car()
@@ -173,10 +746,14 @@ class App(Tk):
             self.update_all_cars()
         elif state == AppStateEnum.INPUT_CAR:
             self.update_input_car()
-
-    # Constants for my sanity. Dont question my formatting decisions
-    HIGHWAY = "Highway"
-    COUNTRY = "Country roads"
+        elif state == AppStateEnum.IMPORT_CARS:
+            self.update_import_cars()
+        elif state == AppStateEnum.PRICE_SWEEP:
+            self.update_price_sweep()
+        elif state == AppStateEnum.FLEET_SUMMARY:
+            self.update_fleet_summary()
+        elif state == AppStateEnum.DIAGNOSTICS:
+            self.update_diagnostics()
 
     def get_road(self):
         """
@@ -187,9 +764,9 @@ class App(Tk):
         car = StringVar()
         car.set("Select a road")
 
-        # Create the widget
+        # Create the widget with every route in the catalogue
         car_selector = OptionMenu(self.sidebar_stack, car, "Select a road",
-                                  self.HIGHWAY, self.COUNTRY)
+                                  *self.routes.names)
         car_selector.pack()
 
         # Return it to the caller to handle
@@ -202,34 +779,91 @@ class App(Tk):
             in the table
             """
 
-            # Clear the contents of the table
-            self.results.clear()
-
             # Get the class objects that represent both the car and the road
             route = self.get_route(road)
             real_car = self.car_store.get_car(car)
 
-            # Add the header row
-            self.results.add_row(["Name", "Price", "Over $400"])
+            # Nothing has been picked yet
+            if real_car is None:
+                self.virtual_results.clear()
+                cheapest['text'] = ""
+                return
+
+            def get_row(_index: int) -> list[str]:
+                # Generate the price based on the route. Asked for again
+                # whenever the row is drawn, so it follows the fuel price
+                price = self.cost_cache.get_cost(real_car, route,
+                                                 self.fuel_price)
+                return [
+                    real_car.name, f"${price:.2f}",
+                    "Yes" if price > 400 else "No"
+                ]
+
+            def show_cheapest() -> None:
+                # The catalogue keeps its routes in order of cost, so this
+                # doesn't price every route
+                for best, cost in self.routes.cheapest_routes(
+                        real_car.kpl, self.fuel_price, 1):
+                    cheapest['text'] = (f"Cheapest route: {best.get_name()} "
+                                        f"(${cost:.2f})")
+
+            def price_changed() -> None:
+                self.virtual_results.render()
+                show_cheapest()
 
-            # Generate the price based on the route
-            price = route.get_cost(real_car.kpl, PRICE)
             # Add the calculated value to the table
-            self.results.add_row([
-                real_car.name, f"${price:.2f}", "Yes" if price > 400 else "No"
-            ])
+            self.virtual_results.set_provider(1, get_row)
+            show_cheapest()
+            self.on_price_change = price_changed
+
+        def search() -> None:
+            """
+            Shows the cars that start with what has been typed so far
+            """
+
+            pending[0] = None
+
+            # The view was changed while we were waiting
+            if not matches.winfo_exists():
+                return
 
-        # Get a list of all the car names
-        car_names = [car.name.capitalize() for car in self.car_store.get()]
+            matches.delete(0, 'end')
 
-        # Select the car
+            for match in self.car_store.search(car.get(), SEARCH_LIMIT):
+                matches.insert('end', match.name.capitalize())
+
+        def typed(*args) -> None:
+            # Wait for the user to stop typing rather than searching on every
+            # key press
+            if pending[0] is not None:
+                self.after_cancel(pending[0])
+            pending[0] = self.after(SEARCH_DELAY, search)
+
+        def picked(_event) -> None:
+            selection = matches.curselection()
+
+            if selection:
+                car.set(matches.get(selection[0]))
+
+        # The search box. Typing a name or picking a match chooses the car
         car = StringVar()
-        car.set("Select a car")
+        Label(self.sidebar_stack, text="Search for a car:").pack()
+        Entry(self.sidebar_stack, textvariable=car).pack(fill='x')
 
-        # Create the dropdown and pack it into the frame
-        car_selector = OptionMenu(self.sidebar_stack, car, "Select a car",
-                                  *car_names)
-        car_selector.pack()
+        # The search that is waiting to run, if there is one
+        pending: list[str | None] = [None]
+        car.trace_add('write', typed)
+
+        # The best matches for what has been typed
+        matches = tk.Listbox(self.sidebar_stack,
+                             height=8,
+                             exportselection=False)
+        matches.bind('<<ListboxSelect>>', picked)
+        matches.pack(fill='x')
+        search()
+
+        # New cars might match what has been typed
+        self.on_cars_added = lambda _added: search()
 
         # Add a road selector
         road, _road_selector = self.get_road()
@@ -240,39 +874,290 @@ class App(Tk):
                         command=lambda: calculate(car.get(), road.get()))
         button.pack()
 
+        # Shows which route would be cheapest for the car
+        cheapest = Label(self.sidebar_stack)
+        cheapest.pack()
+
     def update_all_cars(self) -> None:
         def calculate(road: str) -> None:
             """
             Calculate the price for all cars using the road of the user's choice
             """
 
-            # Clear all the old results
-            self.results.clear()
+            # Stop the last calculation if it is still going
+            self.cancel_calculation()
+            cancelled = threading.Event()
+            self.calculation = cancelled
 
             # Get the route object
             route = self.get_route(road)
 
-            # Add the header row
-            self.results.add_row(["Name", "Price", "Over $400"])
+            # The price the costs below are worked out with. If the price
+            # changes, they are scaled when they are drawn instead of being
+            # worked out again
+            calculated_price = self.fuel_price
+
+            def count_over() -> None:
+                # The sorted kpl index can count these without pricing every
+                # car
+                coefficient = route.get_cost_coefficient(self.fuel_price)
+                over_count = self.car_store.count_over(coefficient, 400)
+                summary['text'] = f"{over_count} cars over $400"
+
+            def price_changed() -> None:
+                # Only the rows on screen are drawn again
+                count_over()
+                self.virtual_results.render()
+
+            count_over()
+            self.on_price_change = price_changed
+
+            if over_only.get() or by_price.get():
+                refresh = show_sorted(route, over_only.get())
+
+                def sorted_changed(*args) -> None:
+                    # A new price or new cars can change which cars are over
+                    # $400 and where each car is in the list
+                    count_over()
+                    refresh()
+
+                self.on_price_change = sorted_changed
+                self.on_cars_added = sorted_changed
+                return
+
+            # Take a copy of the cars so the list can't change under the worker
+            cars = list(self.car_store.get())
+
+            # Filled in as the results come back from the worker
+            prices: list[float] = []
+            results: queue.Queue[list[float] | None] = queue.Queue()
+
+            # Cars added by other programs that haven't been priced yet
+            waiting: list[Car] = []
+
+            def work() -> None:
+                # Runs on a separate thread so the window doesn't freeze.
+                # Anything that has been calculated before comes out of the
+                # cache
+                for start in range(0, len(cars), CALCULATE_CHUNK_SIZE):
+                    if cancelled.is_set():
+                        return
+
+                    results.put(
+                        self.cost_cache.get_costs(
+                            cars[start:start + CALCULATE_CHUNK_SIZE], route,
+                            calculated_price))
+
+                # Tell the main thread that we are done
+                results.put(None)
+
+            def poll() -> None:
+                # Tk isn't thread safe, so the main thread checks for results
+                # every so often and shows them
+                if cancelled.is_set():
+                    return
+
+                finished = False
+
+                while not results.empty():
+                    chunk = results.get()
+
+                    if chunk is None:
+                        finished = True
+                        break
+
+                    prices.extend(chunk)
+
+                self.virtual_results.set_count(len(prices))
+                progress['value'] = len(prices)
+
+                if finished:
+                    self.calculation = None
+                    price_waiting()
+                else:
+                    self.after(50, poll)
+
+            def price_waiting() -> None:
+                # New cars go on the end, so only their rows change
+                cars.extend(waiting)
+                prices.extend(
+                    self.cost_cache.get_costs(waiting, route,
+                                              calculated_price))
+                waiting.clear()
+
+                self.virtual_results.set_count(len(prices))
+                progress['maximum'] = max(1, len(cars))
+                progress['value'] = len(prices)
+
+            def cars_added(added: list[Car]) -> None:
+                count_over()
+                waiting.extend(added)
+
+                # The worker's results have to stay in order, so wait for it
+                # to finish before adding these
+                if self.calculation is not cancelled:
+                    price_waiting()
+
+            def get_row(index: int) -> list[str]:
+                # Only formats the rows that are actually on screen. Cost goes
+                # up in step with the price of fuel
+                price = prices[index] * self.fuel_price / calculated_price
+                return [
+                    cars[index].name, f"${price:.2f}",
+                    "Yes" if price > 400 else "No"
+                ]
+
+            self.virtual_results.set_provider(0, get_row)
+            progress['maximum'] = max(1, len(cars))
+            progress['value'] = 0
+
+            self.on_cars_added = cars_added
+
+            threading.Thread(target=work, daemon=True).start()
+            poll()
+
+        def show_sorted(route: Route,
+                        over_only: bool) -> Callable[[], None]:
+            """
+            Shows the cars sorted by price using the sorted kpl index, so only
+            the rows on screen are ever priced. Returns a function that finds
+            the rows again after the price or the cars change
+            """
+
+            # Most expensive first
+            over = []
+
+            def get_row(index: int) -> list[str]:
+                if over_only:
+                    car = over[index]
+                else:
+                    # Cheapest first, fetched a row at a time as the user
+                    # scrolls
+                    car = self.car_store.get_by_price(index, 1)[0]
 
-            # Calculate the prices for all of the cars
-            price = [(route.get_cost(car.kpl, PRICE), car.name)
-                     for car in self.car_store.get()]
+                price = route.get_cost_coefficient(self.fuel_price) / car.kpl
+                return [
+                    car.name, f"${price:.2f}", "Yes" if price > 400 else "No"
+                ]
 
-            for price, name in price:
-                # Add the calculated value to the table
-                self.results.add_row(
-                    [name, f"${price:.2f}", "Yes" if price > 400 else "No"])
+            def refresh() -> None:
+                # A different price or new cars move the $400 line, which
+                # changes which cars are in the list
+                coefficient = route.get_cost_coefficient(self.fuel_price)
+                over[:] = self.car_store.get_over(coefficient, 400)
+
+                count = len(over) if over_only else len(self.car_store)
+                self.virtual_results.set_count(count)
+
+            self.virtual_results.set_provider(0, get_row)
+            refresh()
+            progress['value'] = 0
+
+            return refresh
+
+        def export_costs() -> None:
+            """
+            Writes the cost of every car on every route to a file the user
+            picks. Runs in the background and streams the rows out in chunks
+            """
+
+            location = filedialog.asksaveasfilename(
+                defaultextension=".csv",
+                filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"),
+                           ("Compressed CSV", "*.csv.gz"),
+                           ("Compressed JSON Lines", "*.jsonl.gz")])
+
+            # The user closed the dialog without picking anything
+            if not location:
+                return
+
+            # The snapshot won't change if cars are added while we write
+            cars = self.car_store.snapshot().get()
+            routes = self.routes.get()
+            fuel_price = self.fuel_price
+
+            # Rows written so far, then a message once it has finished
+            updates: queue.Queue[int | str] = queue.Queue()
+
+            def work() -> None:
+                try:
+                    rows = export(location,
+                                  cars,
+                                  routes,
+                                  fuel_price,
+                                  progress=updates.put)
+                    updates.put(f"Exported {rows} rows")
+                except OSError as error:
+                    updates.put(f"Couldn't export: {error.strerror}")
+
+            def poll() -> None:
+                # The export carries on if the user leaves this view, there
+                # just isn't anything to show it on
+                if not exported.winfo_exists():
+                    return
+
+                while not updates.empty():
+                    update = updates.get()
+
+                    if isinstance(update, str):
+                        exported['text'] = update
+                        return
+
+                    progress['value'] = update
+
+                self.after(50, poll)
+
+            progress['maximum'] = max(1, len(cars) * len(routes))
+            progress['value'] = 0
+            exported['text'] = "Exporting..."
+
+            threading.Thread(target=work, daemon=True).start()
+            poll()
 
         # Summon a road selector
         road, _road_selector = self.get_road()
 
+        # Filters that are answered from the sorted kpl index
+        over_only = BooleanVar()
+        by_price = BooleanVar()
+        Checkbutton(self.sidebar_stack,
+                    text="Only cars over $400",
+                    variable=over_only).pack()
+        Checkbutton(self.sidebar_stack,
+                    text="Sort by price",
+                    variable=by_price).pack()
+
         # Summon a calculate button to trigger the above function
         button = Button(self.sidebar_stack,
                         text="Calculate",
                         command=lambda: calculate(road.get()))
         button.pack()
 
+        # Saves every car's cost on every route to a file
+        Button(self.sidebar_stack, text="Export...",
+               command=export_costs).pack()
+
+        # Shows how many cars have been priced so far
+        progress = Progressbar(self.sidebar_stack, mode='determinate')
+        progress.pack(fill='x')
+
+        # Shows how many cars are over $400
+        summary = Label(self.sidebar_stack)
+        summary.pack()
+
+        # Shows how the last export went
+        exported = Label(self.sidebar_stack)
+        exported.pack()
+
+    def cancel_calculation(self) -> None:
+        """
+        Stops the calculation running in the background, if there is one
+        """
+
+        if self.calculation is not None:
+            self.calculation.set()
+            self.calculation = None
+
     def update_input_car(self) -> None:
         def save(name: str, raw_number: str) -> None:
             try:
@@ -293,6 +1178,10 @@ class App(Tk):
             except StoreDuplicateItem:
                 self.results.write("Two cars cannot have the same name")
                 return
+            except StoreInvalidItem:
+                self.results.write(
+                    "Cars need a name and a KPL that is more than 0")
+                return
 
             # Dump the user back on the home screen for visual feedback. A bit
             # horrible, but it works
@@ -324,16 +1213,310 @@ class App(Tk):
                          command=lambda: save(name.get(), kpl.get()))
         confirm.pack()
 
+    def update_import_cars(self) -> None:
+        def start() -> None:
+            """
+            Asks the user for a file and starts importing it
+            """
+
+            location = filedialog.askopenfilename(
+                filetypes=[("CSV files", "*.csv"), ("All files", "*")])
+
+            # The user closed the dialog without picking anything
+            if not location:
+                return
+
+            self.results.clear()
+            button['state'] = 'disabled'
+
+            try:
+                file = open(location, 'rb')
+                # Seek to the end to get the size for the progress bar
+                size = file.seek(0, 2)
+                file.seek(0)
+            except OSError as error:
+                self.results.write(f"Could not open the file: {error}")
+                button['state'] = 'normal'
+                return
+
+            progress['maximum'] = max(1, size)
+            step(file, size, b"", 0, 0)
+
+        def step(file, size: int, leftover: bytes, added: int,
+                 skipped: int) -> None:
+            """
+            Imports the next chunk of the file, then lets tk redraw before
+            doing the next one
+            """
+
+            # The user has switched to a different view, so stop importing
+            if not progress.winfo_exists():
+                file.close()
+                return
+
+            data = leftover + file.read(IMPORT_CHUNK_SIZE)
+            finished = file.tell() >= size
+
+            # Keep the last partial line for the next chunk
+            if not finished:
+                end = data.rfind(b"\n") + 1
+                data, leftover = data[:end], data[end:]
+
+            names, kpls, dead = parse_lines(data)
+            chunk_added, chunk_skipped = self.car_store.add_many(
+                Car(name, kpl) for name, kpl in zip(names, kpls))
+
+            added += chunk_added
+            skipped += chunk_skipped + dead
+            progress['value'] = file.tell()
+
+            if not finished:
+                self.after(1, step, file, size, leftover, added, skipped)
+                return
+
+            file.close()
+            button['state'] = 'normal'
+            self.results.write(f"Imported {added} cars")
+
+            if skipped:
+                self.results.write(
+                    f"Skipped {skipped} invalid or duplicate cars")
+
+        # Create the import button that asks for a file
+        button = Button(self.sidebar_stack, text="Choose file", command=start)
+        button.pack()
+
+        # Shows how far through the file the import is
+        progress = Progressbar(self.sidebar_stack, mode='determinate')
+        progress.pack(fill='x')
+
+    def update_price_sweep(self) -> None:
+        def run(raw_start: str, raw_stop: str, raw_steps: str) -> None:
+            """
+            Summarises the cost of the fleet over a range of fuel prices
+            """
+
+            try:
+                # Try to parse the users input
+                start = float(raw_start)
+                stop = float(raw_stop)
+                steps = int(raw_steps)
+            except ValueError:
+                # The table is full of sweep results, so the error goes in the
+                # sidebar
+                error['text'] = "Invalid number"
+                return
+
+            error['text'] = ""
+
+            # Stop the last sweep if it is still going
+            self.cancel_calculation()
+            cancelled = threading.Event()
+            self.calculation = cancelled
+
+            kpls = [car.kpl for car in self.car_store.get()]
+            prices = price_range(start, stop, steps)
+            results: queue.Queue[list[dict]] = queue.Queue()
+
+            def work() -> None:
+                # The sweep uses a process pool, but waiting for it would still
+                # freeze the window
+                results.put(sweep(kpls, self.routes.get(), prices))
+
+            def poll() -> None:
+                if cancelled.is_set():
+                    return
+
+                if results.empty():
+                    self.after(50, poll)
+                    return
+
+                summaries = results.get()
+                progress.stop()
+                self.calculation = None
+
+                def get_row(index: int) -> list[str]:
+                    summary = summaries[index]
+                    return [
+                        f"${summary['price']:.3f}", summary['route'],
+                        f"${summary['total']:.2f}",
+                        str(summary['over'])
+                    ] + [
+                        f"${summary[f'p{percent}']:.2f}"
+                        for percent in PERCENTILES
+                    ]
+
+                self.virtual_results.set_provider(len(summaries), get_row)
+
+            self.virtual_results.clear()
+            progress.start()
+
+            threading.Thread(target=work, daemon=True).start()
+            poll()
+
+        # Create labels and entry boxes for the range of prices
+        start = StringVar(value=str(self.fuel_price))
+        stop = StringVar(value=str(self.fuel_price * 2))
+        steps = StringVar(value="1000")
+
+        for text, variable in (("From ($/L):", start), ("To ($/L):", stop),
+                               ("Steps:", steps)):
+            Label(self.sidebar_stack, text=text).pack()
+            Entry(self.sidebar_stack, textvariable=variable).pack()
+
+        # Summon a button to start the sweep
+        button = Button(
+            self.sidebar_stack,
+            text="Run sweep",
+            command=lambda: run(start.get(), stop.get(), steps.get()))
+        button.pack()
+
+        # Moves back and forth while the sweep is running
+        progress = Progressbar(self.sidebar_stack, mode='indeterminate')
+        progress.pack(fill='x')
+
+        # Tells the user about invalid input
+        error = Label(self.sidebar_stack)
+        error.pack()
+
+    def update_fleet_summary(self) -> None:
+        def refresh(*args) -> None:
+            """
+            Shows the fleet's statistics. They are kept up to date by the store
+            as cars are added, so this doesn't look at any of the cars
+            """
+
+            summary = self.car_store.summary()
+
+            rows = [
+                ["Cars", str(summary['count'])],
+                ["Lowest kpl", f"{summary['min_kpl']:.2f}"],
+                ["Highest kpl", f"{summary['max_kpl']:.2f}"],
+                ["Mean kpl", f"{summary['mean_kpl']:.2f}"],
+            ]
+
+            rows += [[f"{percent}th percentile kpl", f"{kpl:.2f}"]
+                     for percent, kpl in summary['percentiles'].items()]
+
+            # The cost of every car on a route is the route's coefficient
+            # times the total of 1 / kpl
+            for route in self.routes.get():
+                total = self.car_store.total_cost(
+                    route.get_cost_coefficient(self.fuel_price))
+                average = total / summary['count'] if summary['count'] else 0
+
+                rows.append([f"Total on {route.get_name()}", f"${total:,.2f}"])
+                rows.append(
+                    [f"Average on {route.get_name()}", f"${average:.2f}"])
+
+                # Read off the end of the sorted kpl index
+                for car, cost in self.routes.cheapest_cars(
+                        route, self.car_store, self.fuel_price, 1):
+                    rows.append([
+                        f"Cheapest on {route.get_name()}",
+                        f"{car.name} (${cost:.2f})"
+                    ])
+
+            rows += [[f"{low:g} to {high:g} kpl", str(count)]
+                     for low, high, count in summary['histogram']]
+
+            # The last bin holds everything past the end of the histogram
+            rows[-1][0] = f"{summary['histogram'][-1][0]:g}+ kpl"
+
+            self.virtual_results.set_provider(len(rows),
+                                              lambda index: rows[index])
+
+        refresh()
+
+        # The totals follow the fuel price and any cars that are added
+        self.on_price_change = refresh
+        self.on_cars_added = refresh
+
+    def update_diagnostics(self) -> None:
+        def refresh() -> None:
+            """
+            Shows the latest timings, then does it again in half a second
+            """
+
+            # The user has switched to a different view
+            if not status.winfo_exists():
+                return
+
+            summary = list(diagnostics.summary().items())
+
+            def get_row(index: int) -> list[str]:
+                label, timings = summary[index]
+                return [label, str(timings['calls'])] + [
+                    f"{timings[key]:.3f}ms"
+                    for key in ('total_ms', 'p50_ms', 'p90_ms', 'p99_ms')
+                ]
+
+            self.virtual_results.set_provider(len(summary), get_row)
+            self.after(500, refresh)
+
+        def toggle() -> None:
+            if enabled.get():
+                diagnostics.enable()
+            else:
+                diagnostics.disable()
+
+        def export() -> None:
+            location = filedialog.asksaveasfilename(
+                defaultextension=".json", filetypes=[("JSON", "*.json")])
+
+            if location:
+                diagnostics.export_json(location)
+                status['text'] = "Exported timings"
+
+        def profile() -> None:
+            if not diagnostics.is_profiling():
+                diagnostics.start_profile()
+                profile_button['text'] = "Stop profile"
+                status['text'] = "Profiling"
+                return
+
+            location = filedialog.asksaveasfilename(
+                defaultextension=".prof", filetypes=[("cProfile", "*.prof")])
+            # Keep profiling if the user doesn't pick a file
+            if not location:
+                return
+
+            diagnostics.stop_profile(location)
+            profile_button['text'] = "Start profile"
+            status['text'] = "Saved profile"
+
+        # Turns the timers on and off
+        enabled = BooleanVar(value=diagnostics.is_enabled())
+        Checkbutton(self.sidebar_stack,
+                    text="Record timings",
+                    variable=enabled,
+                    command=toggle).pack()
+
+        Button(self.sidebar_stack, text="Reset",
+               command=diagnostics.reset).pack()
+        Button(self.sidebar_stack, text="Export JSON", command=export).pack()
+
+        profile_button = Button(self.sidebar_stack,
+                                text="Stop profile" if
+                                diagnostics.is_profiling() else "Start profile",
+                                command=profile)
+        profile_button.pack()
+
+        status = Label(self.sidebar_stack)
+        status.pack()
+
+        refresh()
+
     def get_route(self, road: str) -> Route:
         """
-        Converts the road to a route object, which falls back to a backroad if 
-        it cant find anything. Uses constants defined way up above in this class
+        Converts the road to a route object from the catalogue, which falls
+        back to the first route (or a backroad) if it cant find anything
         """
 
-        if road == self.HIGHWAY:
-            route = Highway()
-        else:
-            route = Backroad()
+        route = self.routes.get_route(road)
+
+        if route is None:
+            route = self.routes.get()[0] if len(self.routes) else Backroad()
 
         return route
 
@@ -341,6 +1524,12 @@ class App(Tk):
     # This exists because I am to lazy to replace all occupances and the
     # performance impact is non-existant
     def destroy(self) -> None:
+        self.price_poller.stop()
+
+        # Make sure every car that was added is saved
+        if self.car_store is not None:
+            self.car_store.close()
+
         self.quit()
 
     def quit(self, code=0) -> None:
@@ -352,6 +1541,10 @@ class App(Tk):
 
 # Only run this in the main file, otherwise print a warning
 if __name__ == "__main__":
+    # Start timing straight away so that loading the store is included
+    if "--diagnostics" in sys.argv:
+        diagnostics.enable()
+
     # Summon
     app = App()
     # Change window title
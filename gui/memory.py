@@ -0,0 +1,72 @@
+import sys
+import tracemalloc
+
+from cars import Car, CarColumns
+
+
+class DictCar():
+    """
+    What a car used to look like before it had __slots__. Only used for
+    comparison
+    """
+
+    def __init__(self, name: str, kpl: float) -> None:
+        self.name = name
+        self.kpl = kpl
+
+
+def measure(build) -> int:
+    """
+    Returns the number of bytes that are allocated by build and still in use
+    once it has finished
+    """
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    # Keep the result alive until we have measured it
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+
+    tracemalloc.stop()
+    del result
+
+    return after - before
+
+
+def compare(count: int) -> dict[str, int]:
+    """
+    Measures how much memory count cars take up in each of the ways that we can
+    store them
+    """
+
+    # The names are made up front so that every layout is charged the same
+    # for its strings
+    names = [f'car {i}' for i in range(count)]
+
+    def dict_cars():
+        return [DictCar(name, float(i)) for i, name in enumerate(names)]
+
+    def slot_cars():
+        return [Car(name, float(i)) for i, name in enumerate(names)]
+
+    def columns():
+        cars = CarColumns()
+        for i, name in enumerate(names):
+            cars.append(Car(name, float(i)))
+        return cars
+
+    return {
+        'list of cars without slots': measure(dict_cars),
+        'list of cars with slots': measure(slot_cars),
+        'columns': measure(columns),
+    }
+
+
+if __name__ == "__main__":
+    # The number of cars can be passed in as the first argument
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    for layout, size in compare(count).items():
+        print(f'{layout}: {size / 1024 / 1024:.2f} MiB '
+              f'({size / count:.1f} bytes per car)')
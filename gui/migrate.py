@@ -0,0 +1,39 @@
+import argparse
+
+from cars import CsvBackend, SqliteBackend, StorageBackend, migrate
+
+
+def open_backend(location: str) -> StorageBackend:
+    """
+    Picks a backend based on the file extension. Databases end in .db, .sqlite
+    or .sqlite3, everything else is treated as csv
+    """
+
+    if location.endswith(('.db', '.sqlite', '.sqlite3')):
+        return SqliteBackend(location)
+
+    return CsvBackend(location)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Copies every car from one store to another')
+    parser.add_argument('source', help='store to copy from, eg. cars.csv')
+    parser.add_argument('target', help='store to replace, eg. cars.db')
+    args = parser.parse_args()
+
+    source = open_backend(args.source)
+    target = open_backend(args.target)
+
+    count = migrate(source, target)
+
+    print(f'Copied {count} cars from {args.source} to {args.target}')
+
+    # A database can check the copy without loading it
+    if isinstance(target, SqliteBackend):
+        summary = target.summary()
+        print(f"{args.target} has {summary['count']} cars, kpl "
+              f"{summary['min_kpl']} to {summary['max_kpl']}")
+
+    source.close()
+    target.close()
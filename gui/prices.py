@@ -0,0 +1,166 @@
+import sys
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable
+
+# Where the file price provider reads the price from
+PRICE_FILE_LOCATION = './price.txt'
+
+# How many seconds to wait between checking the price
+PRICE_POLL_INTERVAL = 5.0
+
+
+class PriceProvider(ABC):
+    """
+    The base for each source of fuel prices
+    """
+
+    @abstractmethod
+    def get_price(self) -> float | None:
+        """
+        Implemented by child classes, returns the current price of fuel per
+        litre, or None if it isn't available right now
+        """
+
+        pass
+
+
+class StaticPriceProvider(PriceProvider):
+    """
+    A price that never changes
+    """
+
+    def __init__(self, price: float) -> None:
+        self.price = price
+
+    def get_price(self) -> float | None:
+        return self.price
+
+
+class FilePriceProvider(PriceProvider):
+    """
+    Reads the price from a text file containing a single number. Other
+    programs can change the price by writing to the file
+    """
+
+    def __init__(self, location: str = PRICE_FILE_LOCATION) -> None:
+        self.location = location
+
+    def get_price(self) -> float | None:
+        try:
+            with open(self.location, 'r') as file:
+                return parse_price(file.read())
+        except OSError:
+            return None
+
+
+class HttpPriceProvider(PriceProvider):
+    """
+    Reads the price from a url that returns a single number, like the stub
+    server at the bottom of this file
+    """
+
+    def __init__(self, url: str, timeout: float = 2.0) -> None:
+        self.url = url
+        self.timeout = timeout
+
+    def get_price(self) -> float | None:
+        # Imported here so that the app doesn't pay for it unless it is used
+        import urllib.request
+
+        try:
+            with urllib.request.urlopen(self.url,
+                                        timeout=self.timeout) as response:
+                return parse_price(response.read().decode('utf-8'))
+        except (OSError, ValueError):
+            # ValueError covers bad urls and responses that aren't text
+            return None
+
+
+def parse_price(text: str) -> float | None:
+    """
+    Turns text into a price, or None if it isn't a positive number
+    """
+
+    try:
+        price = float(text.strip())
+    except ValueError:
+        return None
+
+    return price if price > 0 else None
+
+
+class PricePoller():
+    """
+    Checks a price provider every so often on a background thread and calls
+    on_change with the new price whenever it changes. on_change is called on
+    the background thread
+    """
+
+    def __init__(self,
+                 provider: PriceProvider,
+                 on_change: Callable[[float], None],
+                 interval: float = PRICE_POLL_INTERVAL) -> None:
+        self.provider = provider
+        self.on_change = on_change
+        self.interval = interval
+
+        self.price: float | None = None
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self) -> None:
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stopped.set()
+
+    def run(self) -> None:
+        # Event.wait doubles as a sleep that stop() can interrupt
+        while not self.__stopped.is_set():
+            price = self.provider.get_price()
+
+            if price is not None and price != self.price:
+                self.price = price
+                self.on_change(price)
+
+            self.__stopped.wait(self.interval)
+
+
+def serve(price: float, port: int = 8000) -> None:
+    """
+    Runs a stub price server on localhost for testing HttpPriceProvider. The
+    price can be changed by sending a POST with the new price as the body
+    """
+
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    current = [price]
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self) -> None:
+            body = str(current[0]).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get('Content-Length', 0))
+            new_price = parse_price(self.rfile.read(length).decode('utf-8'))
+
+            if new_price is not None:
+                current[0] = new_price
+
+            self.send_response(204 if new_price is not None else 400)
+            self.end_headers()
+
+    print(f'Serving a fuel price of ${price} on http://localhost:{port}/')
+    HTTPServer(('localhost', port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    # python prices.py 1.52 [port]
+    serve(float(sys.argv[1]), int(sys.argv[2]) if len(sys.argv) > 2 else 8000)
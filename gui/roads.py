@@ -1,5 +1,15 @@
 # Magic python modules
 from abc import ABC, abstractmethod
+from array import array
+
+from cars import Car, CarStore, StoreSnapshot
+
+# NumPy makes the batch calculations much faster, but the program should still
+# work without it
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class Route(ABC):
@@ -46,6 +56,41 @@ class Route(ABC):
 
         return self.get_fuel_consumption(kpl) * fuel_price
 
+    def get_cost_coefficient(self, fuel_price: float) -> float:
+        """
+        Returns the number that a car's kpl needs to divide to get the cost of
+        this route. Lets us skip the method calls when pricing lots of cars
+        """
+
+        return self.get_distance() * fuel_price / self.get_fuel_efficiency()
+
+
+def get_cost_matrix(kpls, routes: list[Route], fuel_price: float,
+                    threshold: float = 400):
+    """
+    Calculates the cost of every car on every route in one go. Returns a tuple
+    of the costs and a mask of which costs are over the threshold, both with
+    one row per car and one column per route.
+
+    kpls can be a list, an array('d') or a NumPy array. If NumPy is installed
+    the results are NumPy arrays, otherwise they are lists of array('d') and
+    lists of bools
+    """
+
+    # Work out each route's coefficient once rather than once per car
+    coefficients = [route.get_cost_coefficient(fuel_price) for route in routes]
+
+    if numpy is not None:
+        costs = numpy.outer(1 / numpy.asarray(kpls, dtype=float),
+                            coefficients)
+        return costs, costs > threshold
+
+    costs = [array('d', [coefficient / kpl for coefficient in coefficients])
+             for kpl in kpls]
+    over = [[cost > threshold for cost in row] for row in costs]
+
+    return costs, over
+
 
 # ==============================================================================
 # Implement all of the Routes
@@ -74,4 +119,163 @@ class Highway(Route):
         return 2558.3
 
     def get_name(self) -> str:
-        return "Highway"
\ No newline at end of file
+        return "Highway"
+
+# ==============================================================================
+# Route catalogue
+
+# Where the catalogue of routes is stored. Each line is name,distance,efficiency
+ROUTE_CATALOGUE_LOCATION = './routes.csv'
+
+
+class CatalogueRoute(Route):
+    """
+    A route that is loaded from the catalogue rather than written as a class
+    """
+
+    def __init__(self, name: str, distance: float, efficiency: float) -> None:
+        self.name = name
+        self.distance = distance
+        self.efficiency = efficiency
+
+    # The following methods are required by the Route abstract class
+
+    def get_fuel_efficiency(self) -> float:
+        return self.efficiency
+
+    def get_distance(self) -> float:
+        return self.distance
+
+    def get_name(self) -> str:
+        return self.name
+
+
+class RouteCatalogue():
+    """
+    Stores lots of routes as columns of distances and efficiencies. Because a
+    car's cost on a route is the route's coefficient divided by the car's kpl,
+    sorting the routes by distance / efficiency once puts them in order of
+    cost for every car
+    """
+
+    def __init__(self, routes: list[Route]) -> None:
+        self.names: list[str] = []
+        self.distances = array('d')
+        self.efficiencies = array('d')
+
+        # Route objects for each entry, made once rather than on every call
+        self.__routes: list[Route] = []
+
+        # Lookup table from the lowercase name to the position of the route
+        self.__index: dict[str, int] = {}
+
+        # Positions of the routes from cheapest to most expensive. Worked out
+        # when it is first needed
+        self.__order: list[int] | None = None
+
+        for route in routes:
+            self.add(route)
+
+    @staticmethod
+    def load(location: str = ROUTE_CATALOGUE_LOCATION) -> 'RouteCatalogue':
+        """
+        Loads the catalogue from a csv file. Falls back to the built in
+        country road and highway if the file doesn't exist. Lines that can't
+        be read are skipped
+        """
+
+        try:
+            with open(location, 'r') as table:
+                lines = table.readlines()
+        except FileNotFoundError:
+            return RouteCatalogue([Backroad(), Highway()])
+
+        routes: list[Route] = []
+
+        for line in lines:
+            try:
+                name, distance, efficiency = line.strip().rsplit(',', 2)
+                route = CatalogueRoute(name.strip(), float(distance),
+                                       float(efficiency))
+            except ValueError:
+                continue
+
+            # Routes without a name or a negative length would break the math
+            if route.name and route.distance >= 0 and route.efficiency > 0:
+                routes.append(route)
+
+        return RouteCatalogue(routes)
+
+    def add(self, route: Route) -> None:
+        """
+        Adds a route to the end of the catalogue
+        """
+
+        self.__index.setdefault(route.get_name().lower(), len(self.__routes))
+        self.__routes.append(route)
+        self.names.append(route.get_name())
+        self.distances.append(route.get_distance())
+        self.efficiencies.append(route.get_fuel_efficiency())
+
+        # The sorted order is worked out again the next time it is needed
+        self.__order = None
+
+    def __len__(self) -> int:
+        return len(self.__routes)
+
+    def get(self) -> list[Route]:
+        """
+        Returns the list of routes
+        """
+
+        return self.__routes
+
+    def get_route(self, name: str) -> Route | None:
+        """
+        Finds a route with the matching name
+        """
+
+        # Capitalization shouldn't mater
+        position = self.__index.get(name.lower())
+
+        if position is None:
+            return None
+
+        return self.__routes[position]
+
+    def get_order(self) -> list[int]:
+        """
+        Returns the positions of the routes sorted from cheapest to most
+        expensive for any car
+        """
+
+        if self.__order is None:
+            factors = [
+                distance / efficiency for distance, efficiency in zip(
+                    self.distances, self.efficiencies)
+            ]
+            self.__order = sorted(range(len(factors)), key=factors.__getitem__)
+
+        return self.__order
+
+    def cheapest_routes(self, kpl: float, fuel_price: float,
+                        k: int) -> list[tuple[Route, float]]:
+        """
+        Returns the k cheapest routes for a car with the given kpl along with
+        how much each would cost. Only those k routes are priced
+        """
+
+        return [(self.__routes[position],
+                 self.__routes[position].get_cost(kpl, fuel_price))
+                for position in self.get_order()[:k]]
+
+    def cheapest_cars(self, route: Route, cars: CarStore | StoreSnapshot,
+                      fuel_price: float, k: int) -> list[tuple[Car, float]]:
+        """
+        Returns the k cheapest cars to drive on a route along with how much
+        each would cost. The cheapest cars are the ones with the highest kpl,
+        which the store keeps sorted, so only those k cars are looked at
+        """
+
+        return [(car, route.get_cost(car.kpl, fuel_price))
+                for car in cars.get_by_price(0, k)]
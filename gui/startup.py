@@ -0,0 +1,115 @@
+import argparse
+import contextlib
+import json
+import math
+import subprocess
+import sys
+import time
+from statistics import median
+
+# How many seconds the imports and store load can take when no budget is given
+BUDGET = 1.0
+
+# How many times to start when none are given. The median is checked, so one
+# slow start doesn't fail the check
+RUNS = 3
+
+
+def measure(location: str | None) -> dict[str, float]:
+    """
+    Times importing the app and loading the car store, the parts of starting
+    up that don't need a window. Only meaningful in a fresh process, because
+    anything already imported is free
+    """
+
+    start = time.perf_counter()
+
+    # main.py complains when it is imported, keep that out of the results
+    with contextlib.redirect_stdout(sys.stderr):
+        import main
+
+    timings = {'import': time.perf_counter() - start}
+
+    from cars import CarStore
+    from migrate import open_backend
+
+    store_start = time.perf_counter()
+    backend = open_backend(location) if location is not None else None
+
+    with contextlib.redirect_stdout(sys.stderr):
+        CarStore(backend=backend).close()
+
+    timings['store load'] = time.perf_counter() - store_start
+    timings['total'] = time.perf_counter() - start
+
+    return timings
+
+
+def run(runs: int, location: str | None) -> list[dict[str, float]]:
+    """
+    Starts a new python for each run so that nothing is already imported.
+    Returns the timings of each run
+    """
+
+    command = [sys.executable, __file__, '--measure']
+
+    if location is not None:
+        command += ['--store', location]
+
+    return [
+        json.loads(
+            subprocess.run(command, capture_output=True, check=True,
+                           text=True).stdout) for _ in range(runs)
+    ]
+
+
+def positive(value: str) -> float:
+    """
+    Parses a number of seconds for argparse, which has to be more than 0
+    """
+
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = math.nan
+
+    if not math.isfinite(seconds) or seconds <= 0:
+        raise argparse.ArgumentTypeError(f'{value} isn\'t a number of seconds')
+
+    return seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Checks that importing the app and loading the cars fits '
+        'in a startup budget, without opening a window')
+    parser.add_argument('--budget',
+                        type=positive,
+                        default=BUDGET,
+                        help='seconds that starting can take')
+    parser.add_argument('--runs', type=int, default=RUNS)
+    parser.add_argument('--store',
+                        help='car store to load, the same as main.py')
+    parser.add_argument('--measure',
+                        action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # The child process that does the actual timing
+    if args.measure:
+        print(json.dumps(measure(args.store)))
+        sys.exit()
+
+    timings = run(max(args.runs, 1), args.store)
+
+    for phase in timings[0]:
+        seconds = median(timing[phase] for timing in timings)
+        print(f'{phase}: {seconds * 1000:.1f}ms')
+
+    total = median(timing['total'] for timing in timings)
+
+    # Let scripts know that starting took too long
+    if total > args.budget:
+        print(f'Startup took longer than the {args.budget}s budget',
+              file=sys.stderr)
+        sys.exit(1)
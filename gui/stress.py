@@ -0,0 +1,131 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+from cars import Car, CarStore
+
+# How many threads add cars and how many read them when none are given
+WRITERS = 4
+READERS = 8
+
+# How many cars each writer adds
+ADDS = 2000
+
+
+def check(store: CarStore) -> list[str]:
+    """
+    Returns a message for everything that is wrong with a snapshot of the
+    store. A snapshot should always look like the store at one moment
+    """
+
+    snapshot = store.snapshot()
+    cars = snapshot.get()
+    problems = []
+
+    if len(snapshot.positions) != len(cars):
+        problems.append(f'{len(cars)} cars but {len(snapshot.positions)} '
+                        'in the name index')
+
+    if len(snapshot.sorted_kpls) != len(cars):
+        problems.append(f'{len(cars)} cars but {len(snapshot.sorted_kpls)} '
+                        'in the kpl index')
+
+    # Only look at the end, which is where the cars are being added
+    for car in cars[max(0, len(cars) - 50):]:
+        if snapshot.get_car(car.name) is None:
+            problems.append(f'{car.name} is missing from the name index')
+
+    return problems
+
+
+def run(writers: int,
+        readers: int,
+        adds: int,
+        columnar: bool = False) -> list[str]:
+    """
+    Adds cars from some threads while others read the store, then checks that
+    nothing was lost or duplicated. Returns a message for each problem found
+    """
+
+    store = CarStore(columnar=columnar)
+    problems: list[str] = []
+    writing = threading.Event()
+    writing.set()
+
+    def write(writer: int) -> None:
+        for i in range(adds):
+            store.add(Car(f'stress {writer} {i}', 1 + i % 20))
+
+    def read() -> None:
+        while writing.is_set():
+            problems.extend(check(store))
+            store.get_car('stress 0 0')
+            store.count_over(1000, 400)
+            len(store)
+
+    threads = [
+        threading.Thread(target=write, args=(writer, ))
+        for writer in range(writers)
+    ]
+    reading = [threading.Thread(target=read) for _ in range(readers)]
+
+    for thread in threads + reading:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    writing.clear()
+
+    for thread in reading:
+        thread.join()
+
+    store.close()
+
+    # Everything should have been added exactly once, in memory and on disk
+    problems.extend(check(store))
+
+    if len(store) != writers * adds:
+        problems.append(f'expected {writers * adds} cars, found {len(store)}')
+
+    if len(CarStore().get()) != writers * adds:
+        problems.append('the saved cars don\'t match the store')
+
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Adds and reads cars from lots of threads at once')
+    parser.add_argument('--writers', type=int, default=WRITERS)
+    parser.add_argument('--readers', type=int, default=READERS)
+    parser.add_argument('--adds',
+                        type=int,
+                        default=ADDS,
+                        help='cars added by each writer')
+    parser.add_argument('--columnar',
+                        action='store_true',
+                        help='store the cars as columns')
+    args = parser.parse_args()
+
+    # The store always uses ./cars.csv, so work in a temporary folder
+    with tempfile.TemporaryDirectory() as folder:
+        home = os.getcwd()
+        os.chdir(folder)
+
+        try:
+            problems = run(args.writers, args.readers, args.adds,
+                           args.columnar)
+        finally:
+            os.chdir(home)
+
+    for problem in problems:
+        print(f'PROBLEM: {problem}', file=sys.stderr)
+
+    print(f'{len(problems)} problems found')
+
+    # Let scripts know that something went wrong
+    if problems:
+        sys.exit(1)
@@ -0,0 +1,149 @@
+import argparse
+import csv
+import math
+import sys
+from bisect import bisect_right
+from itertools import repeat
+from typing import Sequence
+
+from roads import Route, RouteCatalogue
+
+# How many fuel prices each worker process is given at a time
+SWEEP_CHUNK_SIZE = 250
+
+# The percentiles of the cost that are reported for each scenario
+PERCENTILES = (50, 90, 99)
+
+
+def price_range(start: float, stop: float, steps: int) -> list[float]:
+    """
+    Returns steps evenly spaced fuel prices from start to stop, including both
+    """
+
+    if steps <= 1:
+        return [start]
+
+    return [start + (stop - start) * i / (steps - 1) for i in range(steps)]
+
+
+def percentile(values: Sequence[float], percent: float) -> float:
+    """
+    Returns the nearest rank percentile of a sorted list of values
+    """
+
+    if not values:
+        return 0.0
+
+    index = math.ceil(percent / 100 * len(values)) - 1
+    return values[min(max(index, 0), len(values) - 1)]
+
+
+def summarise(kpls: Sequence[float], routes: list[Route],
+              prices: list[float], threshold: float) -> list[dict]:
+    """
+    Summarises the cost of driving every car on every route at each of the
+    fuel prices. Run by the worker processes.
+
+    Cost is the route's coefficient divided by the car's kpl, so each route
+    only needs its cars sorted once. Every price after that is a bisect and a
+    few multiplications rather than a pass over the fleet
+    """
+
+    # 1 / kpl for every car, smallest (cheapest) first
+    inverse = sorted(1 / kpl for kpl in kpls)
+    total_inverse = math.fsum(inverse)
+
+    results = []
+
+    for price in prices:
+        for route in routes:
+            coefficient = route.get_cost_coefficient(price)
+
+            # Cars are over the threshold when coefficient / kpl > threshold.
+            # Free fuel means nothing can be over
+            over = 0
+            if coefficient > 0:
+                over = len(inverse) - bisect_right(inverse,
+                                                   threshold / coefficient)
+
+            summary = {
+                'price': price,
+                'route': route.get_name(),
+                'total': coefficient * total_inverse,
+                'over': over,
+            }
+
+            for percent in PERCENTILES:
+                summary[f'p{percent}'] = coefficient * percentile(
+                    inverse, percent)
+
+            results.append(summary)
+
+    return results
+
+
+def sweep(kpls: Sequence[float],
+          routes: list[Route],
+          prices: list[float],
+          threshold: float = 400,
+          workers: int | None = None) -> list[dict]:
+    """
+    Summarises the fleet's costs on every route at every fuel price. The
+    prices are split into chunks that are summarised in a process pool. The
+    results are ordered by price, then route
+    """
+
+    chunks = [
+        prices[start:start + SWEEP_CHUNK_SIZE]
+        for start in range(0, len(prices), SWEEP_CHUNK_SIZE)
+    ]
+
+    # Starting processes isn't worth it for a single chunk
+    if len(chunks) <= 1:
+        return summarise(kpls, routes, prices, threshold)
+
+    # Imported here because they are slow to import and the app only needs
+    # them once a sweep is run
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = []
+
+    # The app runs sweeps from a worker thread, and forking a process with
+    # other threads running can deadlock the child, so start fresh workers
+    with ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        for chunk in pool.map(summarise, repeat(kpls), repeat(routes), chunks,
+                              repeat(threshold)):
+            results.extend(chunk)
+
+    return results
+
+
+if __name__ == "__main__":
+    from cars import CarStore
+
+    parser = argparse.ArgumentParser(
+        description='Summarises the fleet cost over a range of fuel prices')
+    parser.add_argument('start', type=float, help='lowest fuel price')
+    parser.add_argument('stop', type=float, help='highest fuel price')
+    parser.add_argument('steps', type=int, help='number of prices to try')
+    parser.add_argument('--threshold',
+                        type=float,
+                        default=400,
+                        help='cost that counts as too expensive')
+    parser.add_argument('--workers', type=int, help='number of processes')
+    args = parser.parse_args()
+
+    kpls = [car.kpl for car in CarStore().get()]
+    results = sweep(kpls,
+                    RouteCatalogue.load().get(),
+                    price_range(args.start, args.stop, args.steps),
+                    args.threshold, args.workers)
+
+    # Write the summaries out as csv
+    writer = csv.DictWriter(sys.stdout,
+                            fieldnames=['price', 'route', 'total', 'over'] +
+                            [f'p{percent}' for percent in PERCENTILES])
+    writer.writeheader()
+    writer.writerows(results)